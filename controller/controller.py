@@ -1,9 +1,15 @@
-from core.camera_manager.camera_manager import CameraManager
+from core.camera_manager.camera_manager import CameraManager, BUFFER_MODE_RAW, RECORDING_MODE_CONTINUOUS
+from core.camera_manager.camera_registry import CameraRegistry, load_camera_configs
+from core.camera_manager.retention import RetentionPolicy
+from core.camera_manager.segment_catalog import KIND_EVENT
+from core.camera_manager.motion_gate import MotionGate
+from core.camera_manager.frame import Frame
 from core.seedo_manager import SeeDoManager
 from core.ml.ml_manager import ML_manager
 from core.seedo.seedo import SemanticSimilaritySeeDo
 from core.seedo.schemas import SeeDoSchema, SemanticRegion, SemanticSimilarityConfigSchema, ActionSchema, EmailActionConfig
 from core.seedo.action import EmailAction
+import os
 import time
 from PIL import Image
 import numpy as np
@@ -22,8 +28,19 @@ class AppController:
 
     def __init__(self):
         self.ml_manager = ML_manager()
-        self.camera_manager = CameraManager()
-        self.seedo_manager = SeeDoManager(self.ml_manager, self.camera_manager)
+        self.cameras = CameraRegistry(
+            load_camera_configs(),
+            buffer_mode=get_secret('BUFFER_MODE') or BUFFER_MODE_RAW,
+            recording_mode=get_secret('RECORDING_MODE') or RECORDING_MODE_CONTINUOUS,
+            retention_policy=self._load_retention_policy(),
+            make_motion_gate=MotionGate if get_secret('MOTION_GATING') == 'true' else None,
+            frame_bus_slots=int(get_secret('FRAME_BUS_SLOTS') or 0),
+            # 0 disables the time-lapse archive
+            timelapse_interval_sec=float(get_secret('TIMELAPSE_INTERVAL_SEC') or 5.0)
+        )
+        # Camera shown in the UI preview and used for depth / SeeDo creation
+        self.camera_manager: CameraManager = self.cameras.default
+        self.seedo_manager = SeeDoManager(self.ml_manager, self.cameras)
 
         #NOTE: I could see lazy loading of models being better if there are many models
         # and a given model is not used by any SeeDo instances yet.
@@ -38,15 +55,64 @@ class AppController:
         self.ml_manager.Load_DepthAnythingV2()
         self.ml_manager.Load_MobileNetV3()
 
+        # Stereo depth replaces the DepthAnything preview when a calibrated
+        # pair is configured: STEREO_CAMERAS='left_name,right_name'
+        self.stereo_cameras = None
+        stereo_params = get_secret('STEREO_PARAMS')
+        stereo_cameras = get_secret('STEREO_CAMERAS')
+        if stereo_params and stereo_cameras:
+            left, right = [name.strip() for name in stereo_cameras.split(',')]
+            if left in self.cameras and right in self.cameras:
+                self.stereo_cameras = (self.cameras.get(left), self.cameras.get(right))
+                # Calibration is done on unflipped frames
+                vflip = self.stereo_cameras[0].cap.vflip
+                self.ml_manager.Load_StereoDepth(stereo_params, vflip=vflip)
+            else:
+                print(f"STEREO_CAMERAS {stereo_cameras}: camera not configured, stereo depth disabled")
+
         self.new_seedo_created = False
 
+    @staticmethod
+    def _load_retention_policy() -> RetentionPolicy:
+        """Build the video retention policy from .env, falling back to defaults."""
+        policy = RetentionPolicy()
+        video_max_mb = get_secret('VIDEO_MAX_MB')
+        if video_max_mb:
+            policy.max_total_bytes = int(float(video_max_mb) * 1024 * 1024)
+        segment_age = get_secret('SEGMENT_RETENTION_SEC')
+        if segment_age:
+            policy.segment_max_age_sec = float(segment_age)
+        event_age = get_secret('EVENT_RETENTION_SEC')
+        if event_age:
+            policy.event_max_age_sec = float(event_age)
+        timelapse_max_mb = get_secret('TIMELAPSE_MAX_MB')
+        if timelapse_max_mb:
+            policy.timelapse_max_bytes = int(float(timelapse_max_mb) * 1024 * 1024)
+        timelapse_age = get_secret('TIMELAPSE_RETENTION_SEC')
+        if timelapse_age:
+            policy.timelapse_max_age_sec = float(timelapse_age)
+        return policy
+
     def tick(self):
         """Heartbeat invoked by UI .after() loop."""
-        if self.camera_manager.active:
-            self.camera_manager.capture_frame()
-            self.camera_manager.clear_old_videos()
-            # Is this using the old frame and running it twice?
-            self.seedo_manager.run(self.camera_manager.latest_frame, time.time())
+        now = time.time()
+        for name, camera in self.cameras.items():
+            if camera.active:
+                frame = camera.capture_frame()
+                self.seedo_manager.run(name, frame, now)
+
+    def run_headless(self, tick_interval_sec=0.02):
+        """Drive tick() without the Tk UI. Blocks until interrupted."""
+        self.start_camera()
+        try:
+            while True:
+                self.tick()
+                time.sleep(tick_interval_sec)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.shutdown()
+
     # -------- SEEDO CONTROL ---------
 
     def toggle_seedo(self, seedo_name):
@@ -76,10 +142,12 @@ class AppController:
                 image=image,
                 embedding=emb,
                 roi=roi,
+                normalized=True,
                 image_path=image_path,
                 embedding_path=embedding_path,
                 similarity_threshold=options_data['similarity_threshold'],
-                greater_than=True if options_data['trigger_when'] == 'greater' else False
+                greater_than=True if options_data['trigger_when'] == 'greater' else False,
+                lores_reference=True
             )
             semantic_regions.append(new_region)
 
@@ -98,6 +166,8 @@ class AppController:
         schema = SeeDoSchema(
             type='semantic',
             name=options_data['name'],
+            # ROIs were drawn on the preview camera
+            camera=self.camera_manager.name,
             interval_sec=options_data['trigger_interval_sec'],
             min_retrigger_interval_sec=options_data['min_retrigger_interval_sec'],
             enabled=False,
@@ -120,44 +190,110 @@ class AppController:
 
     def start_camera(self):
         print("Starting camera...")
-        self.camera_manager.active = True
+        for camera in self.cameras:
+            camera.active = True
 
     def stop_camera(self):
         print("Stopping camera...")
-        self.camera_manager.active = False
+        for camera in self.cameras:
+            camera.active = False
 
     def get_latest_frame(self) -> np.ndarray | None:
         return self.camera_manager.latest_frame
 
+    def get_latest(self) -> Frame | None:
+        """Newest Frame, use its cached views instead of converting again."""
+        return self.camera_manager.latest
+
     # -------- RECORDING CONTROL --------
     def start_recording(self):
         print("Recording enabled")
-        self.camera_manager.saving = True
+        for camera in self.cameras:
+            camera.saving = True
 
     def stop_recording(self):
         print("Recording disabled")
-        self.camera_manager.saving = False
+        for camera in self.cameras:
+            camera.saving = False
+
+    def get_recording_stats(self, camera_name: str | None = None) -> dict:
+        """Save-path counters: queued, written, dropped and encode latency.
+        Defaults to the default camera."""
+        camera = self.cameras.get(camera_name) if camera_name else self.camera_manager
+        stats = camera.save_stats.snapshot()
+        stats["capture_dropped_frames"] = camera.dropped_frames
+        # Published frames that found every pool buffer held and were allocated
+        stats["publish_pool_misses"] = camera.publish_pool.misses if camera.publish_pool else 0
+        return stats
+
+    def get_roi_gate_stats(self) -> dict:
+        """Per SeeDo hit/miss counters of the ROI change gate (hits are
+        regions whose embedding was reused)."""
+        return {
+            seedo.name: seedo.change_gate.stats()
+            for seedo in self.seedo_manager.seedos
+            if hasattr(seedo, "change_gate")
+        }
+
+    def get_filmstrip(self, start: float, end: float, max_count: int = 24,
+                      camera_name: str | None = None) -> list[tuple[float, bytes]]:
+        """(timestamp, jpeg) thumbnails of recorded footage in [start, end]."""
+        camera = self.cameras.get(camera_name) if camera_name else self.camera_manager
+        if camera is None or camera.thumbnails is None:
+            return []
+        return camera.thumbnails.filmstrip(start, end, max_count)
+
+    def get_timelapse_frames(self, start: float, end: float, max_count: int | None = None,
+                             camera_name: str | None = None) -> list[tuple[float, bytes]]:
+        """(timestamp, jpeg) frames from the long-retention time-lapse archive."""
+        camera = self.cameras.get(camera_name) if camera_name else self.camera_manager
+        if camera is None or camera.timelapse is None:
+            return []
+        return camera.timelapse.frames(start, end, max_count)
+
+    def export_timelapse(self, start: float, end: float, camera_name: str | None = None) -> str | None:
+        """Write the time-lapse frames in [start, end] to one video, returns its path."""
+        camera = self.cameras.get(camera_name) if camera_name else self.camera_manager
+        if camera is None or camera.timelapse is None:
+            return None
+        output_path = os.path.join(camera.data_dir, f"timelapse_export_{int(start)}_{int(end)}.mp4")
+        # Cataloged like an event clip so retention ages it out and counts it in the budget
+        return camera.combine_avi_segments(
+            output_path, camera.timelapse.files_between(start, end),
+            fps=camera.timelapse.fps, start=start, end=end, kind=KIND_EVENT,
+            playback_fps=camera.timelapse.fps
+        )
 
     # -------- ML CONTROL --------
     def get_embedding(self, imgs: list[Image.Image]) -> np.ndarray:
         """Get embedding from ML model for given image."""
         return self.ml_manager.mobile_net_v3.get_embedding(imgs)
     
+    def _depth_provider(self):
+        """Stereo depth when a calibrated pair is configured, else DepthAnything."""
+        if self.stereo_cameras is not None:
+            return self.ml_manager.stereo_depth
+        return self.ml_manager.depth_anything_v2_vits_378
+
     def start_running_depth_map(self):
-        if self.ml_manager.depth_anything_v2_vits_378:
-            self.ml_manager.depth_anything_v2_vits_378.start_running_depth_map()
+        if self._depth_provider():
+            self._depth_provider().start_running_depth_map()
     
     def stop_running_depth_map(self):
-        if self.ml_manager.depth_anything_v2_vits_378:
-            self.ml_manager.depth_anything_v2_vits_378.stop_running_depth_map()
+        if self._depth_provider():
+            self._depth_provider().stop_running_depth_map()
    
     
     def request_depth(self):
-        if self.ml_manager.depth_anything_v2_vits_378:
-            self.ml_manager.depth_anything_v2_vits_378.request_depth(self.get_latest_frame())
+        if self.stereo_cameras is not None:
+            left, right = (camera.latest for camera in self.stereo_cameras)
+            if left is not None and right is not None:
+                self.ml_manager.stereo_depth.request_depth(left, right)
+        elif self.ml_manager.depth_anything_v2_vits_378:
+            self.ml_manager.depth_anything_v2_vits_378.request_depth(self.get_latest())
 
     def get_depth_map_gray_scale(self):
-        dm = self.ml_manager.depth_anything_v2_vits_378
+        dm = self._depth_provider()
 
         if dm is None:
             return None
@@ -173,6 +309,4 @@ class AppController:
     def shutdown(self):
         """Gracefully stop camera, recorder, and release hardware."""
         print("Controller shutdown")
-        self.camera_manager.active = False
-        self.camera_manager.saving = False
-        self.camera_manager.release()
+        self.cameras.release()
@@ -0,0 +1,313 @@
+"""Camera throughput / CPU benchmark.
+
+Drives each capture backend through a resolution x FOURCC x fps matrix and
+measures delivered fps, frame-interval jitter, CPU per frame and RSS, with
+recording and frame conversion switched on and off. Results are written as
+JSON so different Pi models and camera modules can be compared.
+
+    python main.py --benchmark --backends USB,SYNTHETIC --sizes 640x480,1280x720 \\
+        --fourcc MJPG,YUYV --fps 15,30 --duration 10
+
+recording: every frame is written to an MJPEG AVI (JPEG-encoded first when
+the camera delivers raw frames), as continuous recording does.
+conversion: every frame is turned into the views the app consumes (RGB and
+the lores stream), which includes the JPEG decode in passthrough mode.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import socket
+import tempfile
+import time
+import cv2
+import numpy as np
+import psutil
+
+from core.camera_manager.camera_pipeline import get_camera_pipeline
+from core.camera_manager.frame import Frame
+from core.camera_manager.mjpeg_avi import MjpegAviWriter, jpeg_size
+
+BENCHMARK_DIR = "data/benchmarks"
+# How often RSS is sampled during a run
+RSS_SAMPLE_INTERVAL_SEC = 0.5
+# Give up on a run after this many failed reads in a row
+MAX_FAILED_READS = 30
+
+
+def _parse_list(value: str, cast=str) -> list:
+    return [cast(item.strip()) for item in value.split(",") if item.strip()]
+
+
+def _parse_size(value: str) -> tuple[int, int]:
+    w, h = value.lower().split("x")
+    return int(w), int(h)
+
+
+def _device_model() -> str | None:
+    """Board name on a Raspberry Pi (and other device-tree systems)."""
+    try:
+        with open("/proc/device-tree/model") as f:
+            return f.read().strip("\0\n ")
+    except OSError:
+        return None
+
+
+def system_info() -> dict:
+    return {
+        "hostname": socket.gethostname(),
+        "device_model": _device_model(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "cpu_count": os.cpu_count(),
+        "memory_total_mb": psutil.virtual_memory().total / (1024 * 1024),
+    }
+
+
+def _percentiles(values_ms: list[float]) -> dict:
+    if not values_ms:
+        return {}
+    values = np.asarray(values_ms)
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {"p50": float(p50), "p90": float(p90), "p99": float(p99),
+            "max": float(values.max()), "std": float(values.std())}
+
+
+def measure(cap, duration_sec: float, record: bool, convert: bool, fps: float,
+            lores_size=None, jpeg_quality=85, warmup_sec=1.0) -> dict:
+    """Read frames from an open capture for duration_sec and report timings."""
+    process = psutil.Process()
+    compressed = cap.compressed
+
+    def read():
+        if compressed:
+            ok, jpeg = cap.read_compressed()
+            return ok and jpeg is not None, jpeg
+        return cap.read()
+
+    # Let exposure and the driver's queue settle
+    warmup_end = time.monotonic() + warmup_sec
+    while time.monotonic() < warmup_end:
+        read()
+
+    writer = None
+    tmp_dir = None
+    if record:
+        tmp_dir = tempfile.mkdtemp(prefix="seedo_bench_")
+        writer = MjpegAviWriter(os.path.join(tmp_dir, "bench.avi"), fps)
+
+    intervals_ms = []
+    frames = 0
+    failed = 0
+    failed_in_row = 0
+    actual_size = None
+    rss_peak = process.memory_info().rss
+    next_rss_sample = 0.0
+
+    cpu_start = process.cpu_times()
+    t0 = time.monotonic()
+    last = None
+    while True:
+        now = time.monotonic()
+        if now - t0 >= duration_sec:
+            break
+        ok, data = read()
+        now = time.monotonic()
+        if not ok:
+            failed += 1
+            failed_in_row += 1
+            if failed_in_row >= MAX_FAILED_READS:
+                break
+            continue
+        failed_in_row = 0
+        if last is not None:
+            intervals_ms.append((now - last) * 1000)
+        last = now
+        frames += 1
+
+        if actual_size is None:
+            actual_size = jpeg_size(data) if compressed else (data.shape[1], data.shape[0])
+
+        if convert:
+            if compressed:
+                frame = Frame.from_jpeg(frames, now, data, wall_time=time.time(), lores_size=lores_size)
+            else:
+                frame = Frame(frames, now, data, wall_time=time.time(),
+                              lores=cap.read_lores(), lores_size=lores_size)
+            # Both views are computed on first access
+            _ = frame.rgb, frame.lores
+
+        if writer is not None:
+            if compressed:
+                jpeg = data
+            else:
+                ok, encoded = cv2.imencode(".jpg", data, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+                jpeg = encoded.tobytes() if ok else None
+            if jpeg is not None:
+                writer.write_frame(jpeg, time.time())
+
+        if now >= next_rss_sample:
+            rss_peak = max(rss_peak, process.memory_info().rss)
+            next_rss_sample = now + RSS_SAMPLE_INTERVAL_SEC
+
+    elapsed = time.monotonic() - t0
+    cpu_end = process.cpu_times()
+    cpu_sec = (cpu_end.user - cpu_start.user) + (cpu_end.system - cpu_start.system)
+    rss_end = process.memory_info().rss
+
+    recorded_bytes = 0
+    if writer is not None:
+        writer.close()
+        recorded_bytes = os.path.getsize(writer.path)
+        os.remove(writer.path)
+        os.rmdir(tmp_dir)
+
+    return {
+        "frames": frames,
+        "failed_reads": failed,
+        "duration_sec": elapsed,
+        "actual_size": list(actual_size) if actual_size else None,
+        "fps": frames / elapsed if elapsed > 0 else 0.0,
+        "interval_ms": _percentiles(intervals_ms),
+        # Percent of one core, all threads of the process (OpenCV, libcamera)
+        "cpu_percent": cpu_sec / elapsed * 100 if elapsed > 0 else 0.0,
+        "cpu_ms_per_frame": cpu_sec * 1000 / frames if frames else None,
+        "rss_mb_peak": max(rss_peak, rss_end) / (1024 * 1024),
+        "rss_mb_end": rss_end / (1024 * 1024),
+        "recorded_bytes": recorded_bytes,
+    }
+
+
+def _open_capture(backend, size, fourcc, fps, args):
+    pipeline_class = get_camera_pipeline(backend)
+    options = {"lores_size": args.lores_size}
+    if backend == "USB":
+        options.update(fourcc=fourcc, fps=fps, compressed=fourcc == "MJPG" and not args.no_passthrough)
+    elif backend == "PI":
+        options.update(fps=fps)
+    elif backend == "FILE":
+        options.update(source=args.source, realtime=not args.unpaced, fps=fps)
+    elif backend == "SYNTHETIC":
+        options.update(realtime=not args.unpaced, fps=fps)
+    return pipeline_class(size[0], size[1], args.device, **options)
+
+
+def run_matrix(args) -> list[dict]:
+    results = []
+    modes = [(record, convert) for record in (False, True) for convert in (False, True)]
+    if args.modes:
+        modes = [m for m in modes if _mode_name(*m) in args.modes]
+
+    for backend, size, fourcc, fps in itertools.product(args.backends, args.sizes, args.fourcc, args.fps):
+        # FOURCC only means something for USB cameras
+        if backend != "USB" and fourcc != args.fourcc[0]:
+            continue
+        cell = {
+            "backend": backend,
+            "requested_size": list(size),
+            "fourcc": fourcc if backend == "USB" else None,
+            "requested_fps": fps,
+        }
+        try:
+            cap = _open_capture(backend, size, cell["fourcc"], fps, args)
+        except Exception as err:
+            print(f"[BENCHMARK] {backend} {size[0]}x{size[1]}: could not open ({err})")
+            results.append({**cell, "error": str(err)})
+            continue
+
+        try:
+            if not cap.isOpened():
+                results.append({**cell, "error": "camera did not open"})
+                continue
+            for record, convert in modes:
+                result = {**cell, "mode": _mode_name(record, convert), "record": record,
+                          "convert": convert, "compressed": cap.compressed}
+                try:
+                    result.update(measure(cap, args.duration, record, convert, fps,
+                                          lores_size=args.lores_size, warmup_sec=args.warmup))
+                except Exception as err:
+                    result["error"] = str(err)
+                results.append(result)
+                _print_result(result)
+        finally:
+            cap.release()
+    return results
+
+
+def _mode_name(record: bool, convert: bool) -> str:
+    return {(False, False): "capture", (False, True): "convert",
+            (True, False): "record", (True, True): "record+convert"}[(record, convert)]
+
+
+def _print_result(r: dict):
+    label = f"{r['backend']:<9} {r['requested_size'][0]}x{r['requested_size'][1]:<5} " \
+            f"{r['fourcc'] or '-':<4} {r['requested_fps']:>4g}fps {r['mode']:<14}"
+    if "error" in r:
+        print(f"[BENCHMARK] {label} error: {r['error']}")
+        return
+    interval = r["interval_ms"]
+    print(f"[BENCHMARK] {label} {r['fps']:6.2f} fps  "
+          f"interval p50 {interval.get('p50', 0):6.1f} p99 {interval.get('p99', 0):6.1f} ms  "
+          f"cpu {r['cpu_percent']:5.1f}% ({r['cpu_ms_per_frame'] or 0:.2f} ms/frame)  "
+          f"rss {r['rss_mb_peak']:.0f} MB")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark camera capture throughput and CPU cost.")
+    parser.add_argument("--backends", type=_parse_list, default=["SYNTHETIC"],
+                        help="comma separated: USB, PI, FILE, SYNTHETIC")
+    parser.add_argument("--sizes", type=lambda v: _parse_list(v, _parse_size),
+                        default=[(640, 480), (1280, 720)], help="e.g. 640x480,1280x720")
+    parser.add_argument("--fourcc", type=_parse_list, default=["MJPG", "YUYV"],
+                        help="USB only, e.g. MJPG,YUYV")
+    parser.add_argument("--fps", type=lambda v: _parse_list(v, float), default=[30.0])
+    parser.add_argument("--modes", type=_parse_list, default=None,
+                        help="subset of capture, convert, record, record+convert")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per run")
+    parser.add_argument("--warmup", type=float, default=1.0, help="seconds discarded before each run")
+    parser.add_argument("--device", type=int, default=0)
+    parser.add_argument("--lores-size", type=_parse_size, default=(640, 360))
+    parser.add_argument("--source", default=None, help="video file or image directory for FILE")
+    parser.add_argument("--unpaced", action="store_true",
+                        help="FILE/SYNTHETIC deliver frames as fast as possible")
+    parser.add_argument("--no-passthrough", action="store_true",
+                        help="USB MJPG is decoded by OpenCV instead of passed through")
+    parser.add_argument("--output", default=None, help="JSON file to write")
+    args = parser.parse_args(argv)
+    args.backends = [b.upper() for b in args.backends]
+    args.fourcc = [f.upper() for f in args.fourcc]
+
+    started = time.time()
+    results = run_matrix(args)
+    report = {
+        "started": started,
+        "system": system_info(),
+        "settings": {
+            "duration_sec": args.duration,
+            "warmup_sec": args.warmup,
+            "lores_size": list(args.lores_size) if args.lores_size else None,
+            "unpaced": args.unpaced,
+            "passthrough": not args.no_passthrough,
+        },
+        "results": results,
+    }
+
+    output = args.output
+    if output is None:
+        BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(started))
+        output = os.path.join(BASE_DIR, BENCHMARK_DIR, f"camera_{socket.gethostname()}_{stamp}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[BENCHMARK] {len(results)} results written to {output}")
+    return 0 if results and not all("error" in r for r in results) else 1
+
+
+if __name__ == "__main__":
+    from core.secrets import load_secrets
+    load_secrets()
+    raise SystemExit(main())
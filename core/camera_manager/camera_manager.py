@@ -2,274 +2,885 @@ import cv2
 import time
 import numpy as np
 import threading
-from queue import Queue   
+from queue import Queue, Full, Empty
+from concurrent.futures import ThreadPoolExecutor
 import os
-from typing import List
+import math
+from collections import deque
+from typing import Callable, Dict, List
 from core.camera_manager.camera_pipeline import get_camera_pipeline
+from core.camera_manager.constants import DEFAULT_CAMERA
+from core.camera_manager.frame_buffer import FrameRingBuffer, FrameLease, EncodedFrameRing, FrameSegment, PublishPool
+from core.camera_manager.mjpeg_avi import MjpegAviWriter, MjpegAviReader, remux_stream_copy, jpeg_size
+from core.camera_manager.segment_catalog import SegmentCatalog, SegmentRecord, KIND_SEGMENT, KIND_EVENT
+from core.camera_manager.retention import RetentionManager, RetentionPolicy
+from core.camera_manager.save_stats import SaveStats
+from core.camera_manager.motion_gate import MotionGate, DECISION_SAVE, DECISION_WAIT
+from core.camera_manager.frame import Frame
+from core.camera_manager.frame_bus import FrameBus, FrameBusHandle
+from core.camera_manager.thumbnail_index import ThumbnailIndex
+from core.camera_manager.timelapse import TimelapseArchive
 import timeit
 
 CAM_DATA_DIR ='data/video'
 
+# Buffering modes
+# raw: uncompressed frames in a preallocated ring, encoded by the save worker
+# jpeg: frames JPEG-encoded by a worker pool right after capture and held in
+#       a ring bounded by buffer_bytes_budget, written to AVI without re-encoding
+BUFFER_MODE_RAW = 'raw'
+BUFFER_MODE_JPEG = 'jpeg'
+
+# Recording modes
+# continuous: every completed segment is written while saving is on
+# event: nothing is written until record_event_clip() cuts a clip from the
+#        in-memory pre-roll plus the post-roll as it arrives
+RECORDING_MODE_CONTINUOUS = 'continuous'
+RECORDING_MODE_EVENT = 'event'
+
+# What to do when saving falls behind: a segment is ready but the save queue
+# is full, or (raw mode) the next ring slot is still leased by a pending save
+# block: wait for space, which stalls capture (explicit backpressure); on the
+#        ring for at most one segment duration, then the frame is dropped
+# drop_oldest: discard the oldest queued segment to make room
+# reduce_quality: save workers encode at OVERFLOW_JPEG_QUALITY while the
+#                 queue is at least half full or the ring ran out of room,
+#                 then block if it fills anyway. Frame size never changes,
+#                 so segments always combine cleanly.
+OVERFLOW_BLOCK = 'block'
+OVERFLOW_DROP_OLDEST = 'drop_oldest'
+OVERFLOW_REDUCE_QUALITY = 'reduce_quality'
+OVERFLOW_JPEG_QUALITY = 50
+# How often a blocked capture re-checks the ring for a free slot
+RING_WAIT_POLL_SEC = 0.005
+# Pause after an exception in the capture loop before reading again
+CAPTURE_ERROR_BACKOFF_SEC = 0.5
+
+# Raw ring frames leased at once when encoding buffered frames for a clip
+BUFFERED_ENCODE_CHUNK = 4
+# Recycled buffers for published frames still held by consumers (the latest
+# frame, SeeDo evaluations, the preview); more are allocated when all are held
+PUBLISH_POOL_SIZE = 8
+
+# Which stream is published on the shared-memory frame bus
+BUS_STREAM_MAIN = 'main'
+BUS_STREAM_LORES = 'lores'
+
 class CameraManager:
-    def __init__(self, target_fps=30, device_index=0, buffer_seconds=2):
+    def __init__(self, target_fps=30, device_index=0, buffer_seconds=2, threaded_capture=True,
+                 ring_segments=2, buffer_mode=BUFFER_MODE_RAW,
+                 buffer_bytes_budget=96 * 1024 * 1024, jpeg_quality=85, encode_workers=2,
+                 recording_mode=RECORDING_MODE_CONTINUOUS, retention_policy: RetentionPolicy | None = None,
+                 save_workers=2, save_queue_size=2, overflow_policy=OVERFLOW_DROP_OLDEST,
+                 motion_gate: MotionGate | None = None, idle_keyframe_interval_sec: float | None = 5.0,
+                 lores_size: tuple[int, int] | None = (640, 360), name=DEFAULT_CAMERA,
+                 camera_type: str | None = None, pipeline_options: dict | None = None,
+                 frame_bus_slots: int = 0, frame_bus_stream: str = BUS_STREAM_MAIN,
+                 thumbnail_interval_sec: float | None = 10.0,
+                 timelapse_interval_sec: float | None = 5.0,
+                 timelapse_size: tuple[int, int] = (384, 216)):
+
+        self.name = name
+        self.device_index = device_index
 
         self.target_width = 1280
         self.target_height = 720
+        # Analysis stream (SeeDos, depth, preview). The main stream at target
+        # size is only recorded. None analyses the main stream directly.
+        # The height is refitted to the main stream's aspect ratio on the
+        # first frame, the camera may not deliver the size asked for.
+        self.lores_size = tuple(lores_size) if lores_size else None
+        self._lores_fitted = False
 
-        self.video_retention_time_sec = 60 
-        self.last_video_clear = time.time()
+        BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.data_dir = os.path.join(BASE_DIR, CAM_DATA_DIR)
+        if name != DEFAULT_CAMERA:
+            self.data_dir = os.path.join(self.data_dir, name)
+        self.catalog = SegmentCatalog(self.data_dir)
+
+        # Filmstrip of recorded footage: a small JPEG on scene change and at
+        # least every thumbnail_interval_sec while recording
+        self.thumbnails: ThumbnailIndex | None = None
+        if thumbnail_interval_sec:
+            self.thumbnails = ThumbnailIndex(
+                os.path.join(self.data_dir, "thumbs"), interval_sec=thumbnail_interval_sec
+            )
+
+        # Low-rate, downscaled history kept for days in daily files, with
+        # its own retention budget. One frame per timelapse_interval_sec
+        # while recording.
+        self.timelapse: TimelapseArchive | None = None
+        if timelapse_interval_sec:
+            self.timelapse = TimelapseArchive(
+                os.path.join(self.data_dir, "timelapse"), interval_sec=timelapse_interval_sec,
+                width=timelapse_size[0], height=timelapse_size[1]
+            )
+
+        # One long-lived worker evicts old files from the catalog
+        self.retention = RetentionManager(
+            self.catalog, retention_policy or RetentionPolicy(),
+            thumbnails=self.thumbnails, timelapse=self.timelapse
+        )
+        self.retention.start()
 
 
-        pipeline_class = get_camera_pipeline()
+        pipeline_class = get_camera_pipeline(camera_type)
 
-        self.cap = pipeline_class(self.target_width, self.target_height,0)
+        self.cap = pipeline_class(self.target_width, self.target_height, device_index,
+                                  lores_size=self.lores_size, **(pipeline_options or {}))
         # set camera resolution, this will fail silently if unsupported
 
         self.target_fps = target_fps
         self.last_frame_time = 0
-        self.latest_frame = None
+        # Newest published Frame, derived views (RGB, gray, ...) are computed
+        # on demand and shared by every consumer of the frame
+        self.latest: Frame | None = None
+        # Monotonically increasing id of latest, 0 means no frame yet
+        self.latest_seq = 0
+        self._latest_lock = threading.Lock()
         self.active = False
-        self.saving = False
 
-        # Shared buffer for frame capture
-        self.buffer = []
-        self.buffer_lock = threading.Lock()
+        # Recordings still being written, path -> (start, end). They are
+        # readable through their live index until they land in the catalog.
+        self._live_files: Dict[str, tuple[float, float]] = {}
+        self._live_lock = threading.Lock()
+        self.saving = False
 
-        # Queue for save jobs
-        self.save_queue = Queue()
-        self.save_thread = threading.Thread(
-            target=self._save_worker, daemon=True
-        )
-        self.save_thread.start() 
+        # Preallocated frame ring, created on the first frame once the actual
+        # resolution is known. Holds ring_segments save segments so capture
+        # can keep writing while the save worker holds a lease on one.
+        self.ring: FrameRingBuffer | None = None
+        self.publish_pool: PublishPool | None = None
+        self.ring_segments = max(2, ring_segments)
+        self.dropped_frames = 0
+
+        if buffer_mode not in (BUFFER_MODE_RAW, BUFFER_MODE_JPEG):
+            raise ValueError(f"Unknown buffer_mode: {buffer_mode}")
+        # Compressed passthrough: the camera's JPEG bytes go straight into the
+        # encoded ring and recordings, frames are only decoded for consumers
+        self.compressed_capture = self.cap.compressed
+        if self.compressed_capture and buffer_mode != BUFFER_MODE_JPEG:
+            print("Camera delivers JPEG frames, using jpeg buffer mode")
+            buffer_mode = BUFFER_MODE_JPEG
+        # The raw ring only holds a few seconds, far less than an event
+        # clip's pre-roll. The encoded ring holds tens of seconds.
+        if recording_mode == RECORDING_MODE_EVENT and buffer_mode != BUFFER_MODE_JPEG:
+            print("Event recording needs a long pre-roll, using jpeg buffer mode")
+            buffer_mode = BUFFER_MODE_JPEG
+        self.buffer_mode = buffer_mode
+        self.jpeg_quality = jpeg_quality
+        self.encode_workers = encode_workers
+        self.encoded_ring: EncodedFrameRing | None = None
+        self.encode_pool: ThreadPoolExecutor | None = None
+        self._encode_seq = 0
+
+        if recording_mode not in (RECORDING_MODE_CONTINUOUS, RECORDING_MODE_EVENT):
+            raise ValueError(f"Unknown recording_mode: {recording_mode}")
+        self.recording_mode = recording_mode
+
+        # Bounded queue of save jobs feeding a pool of writer threads. cv2
+        # encoding releases the GIL, so several workers encode in parallel.
+        if overflow_policy not in (OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_REDUCE_QUALITY):
+            raise ValueError(f"Unknown overflow_policy: {overflow_policy}")
+        self.overflow_policy = overflow_policy
+        self.save_stats = SaveStats()
+        self.save_queue = Queue(maxsize=save_queue_size)
+        # Set when capture found the next raw ring slot still leased by a save
+        self._ring_backed_up = False
+        self.save_threads = []
+        for _ in range(save_workers):
+            thread = threading.Thread(target=self._save_worker, daemon=True)
+            thread.start()
+            self.save_threads.append(thread)
 
         self.buffer_seconds = buffer_seconds
         self.max_frames = int(self.target_fps * self.buffer_seconds)
 
-    def capture_frame(self) -> np.ndarray | None:
-        """Grab frames throttled to target fps."""
+        # Optional motion gating: completed segments are held until the gate
+        # can judge them (pre-padding), then saved, reduced to keyframes
+        # (one per idle_keyframe_interval_sec) or dropped when idle.
+        self.motion_gate = motion_gate
+        self.idle_keyframe_interval_sec = idle_keyframe_interval_sec
+        self._held_segments: deque[FrameSegment] = deque()
+        self._held_lock = threading.Lock()
+        if self.motion_gate is not None:
+            # Held raw segments keep their ring lease, leave room for them
+            held = math.ceil(self.motion_gate.pre_seconds / self.buffer_seconds) + 1
+            self.ring_segments = max(self.ring_segments, held + 2)
+
+        if self.buffer_mode == BUFFER_MODE_JPEG:
+            # In jpeg mode the raw ring is only a small staging area between
+            # capture and the encoder pool.
+            self.encoded_ring = EncodedFrameRing(buffer_bytes_budget, segment_frames=self.max_frames)
+            if not self.compressed_capture:
+                self.encode_pool = ThreadPoolExecutor(
+                    max_workers=encode_workers, thread_name_prefix="jpeg-encode"
+                )
+
+        # Optional shared-memory ring so other processes can map frames
+        # without pickling. Created on the first frame, named
+        # seedo_<camera>_<stream> so readers can attach by name.
+        if frame_bus_stream not in (BUS_STREAM_MAIN, BUS_STREAM_LORES):
+            raise ValueError(f"Unknown frame_bus_stream: {frame_bus_stream}")
+        self.frame_bus_slots = frame_bus_slots
+        self.frame_bus_stream = frame_bus_stream
+        self.frame_bus: FrameBus | None = None
+
+        # When threaded, a background thread owns self.cap.read() and the
+        # Tk tick only reads the newest frame.
+        self.threaded_capture = threaded_capture
+        self._stop_event = threading.Event()
+        self.capture_thread = None
+        if self.threaded_capture:
+            self.capture_thread = threading.Thread(
+                target=self._capture_worker, daemon=True
+            )
+            self.capture_thread.start()
+
+    @property
+    def latest_frame(self) -> np.ndarray | None:
+        """RGB array of the newest frame (kept for older callers)."""
+        frame = self.latest
+        return frame.rgb if frame is not None else None
+
+    @property
+    def latest_frame_ts(self) -> float:
+        frame = self.latest
+        return frame.timestamp if frame is not None else 0.0
+
+    def capture_frame(self) -> Frame | None:
+        """Grab frames throttled to target fps.
+
+        In threaded mode the capture thread does the grabbing, so this only
+        returns the newest frame.
+        """
         if not self.active:
             return None
+        if self.threaded_capture:
+            return self.latest
         now = time.time()
         #TODO: adding + .01 here gets the fps closer to actually 15. Do I care?
         if (now - self.last_frame_time  )>= (1 / self.target_fps):
-            ret, frame = self.cap.read()
-            if ret:
-                # uncomment last line to see actual frame rate
-                #print(f"actual frame rate: {1/(now-self.last_frame_time)}")
-                self.latest_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                self.buffer.append((now, frame.copy()))
-
-                if len(self.buffer) >= self.max_frames:
-                    if not self.saving:
-                        print("Buffer full but not currently saving, clearing buffer.")
-                        self.buffer.clear()
-                    else:
-                        self._initiate_saving()
-
+            self._grab_frame()
             self.last_frame_time = time.time()
-            return self.latest_frame
+        return self.latest
+
+    def get_latest(self) -> Frame | None:
+        """Newest published Frame, its seq identifies it."""
+        return self.latest
+
+    def _capture_worker(self):
+        """Thread worker that reads frames paced against a monotonic clock."""
+        period = 1 / self.target_fps
+        next_deadline = time.monotonic()
+        while not self._stop_event.is_set():
+            if not self.active:
+                self._stop_event.wait(0.05)
+                next_deadline = time.monotonic()
+                continue
+
+            try:
+                self._grab_frame()
+            except Exception as err:
+                # A full disk or one bad frame must not end capture for good
+                print(f"[{self.name}] capture error: {err!r}")
+                self._stop_event.wait(CAPTURE_ERROR_BACKOFF_SEC)
+                next_deadline = time.monotonic()
+                continue
+
+            next_deadline += period
+            delay = next_deadline - time.monotonic()
+            if delay > 0:
+                self._stop_event.wait(delay)
+            else:
+                # Fell behind (slow read), resync rather than burst to catch up
+                next_deadline = time.monotonic()
+
+    def _grab_frame(self):
+        """Read one frame straight into the next ring slot and publish it."""
+        if self.compressed_capture:
+            self._grab_compressed_frame()
+            return
+
+        slot = None
+        out = None
+        if self.ring is not None:
+            slot = self.ring.next_slot()
+            if slot is not None:
+                out = self.ring.frames[slot]
+
+        ret, frame = self.cap.read(out)
+        if not ret:
+            return
+        now = time.time()
+        # uncomment last line to see actual frame rate
+        #print(f"actual frame rate: {1/(now-self.last_frame_time)}")
+        # A frame read into a ring slot is overwritten when the ring wraps.
+        # The published Frame gets a copy in a pooled buffer, returned to the
+        # pool once the Frame's last reference is gone, so consumers never
+        # hold ring slots.
+        native, lease = frame, None
+        if frame is out:
+            if self.publish_pool is None:
+                self.publish_pool = PublishPool(PUBLISH_POOL_SIZE, *frame.shape)
+            native, lease = self.publish_pool.copy(frame)
+        lores = self.cap.read_lores()
+        if not self._lores_fitted:
+            self._fit_lores_size(frame.shape[1], frame.shape[0])
+        with self._latest_lock:
+            self.latest_seq += 1
+            published = Frame(self.latest_seq, time.monotonic(), native, wall_time=now,
+                              lores=lores, lores_size=self.lores_size, lease=lease)
+            self.latest = published
+
+        if self.frame_bus_slots:
+            self._publish_to_bus(published)
+
+        if self.thumbnails is not None and self.saving:
+            self.thumbnails.offer(published, now)
+        if self.timelapse is not None and self.saving:
+            self.timelapse.offer(published, now)
+
+        if self.motion_gate is not None and self._persist_segments():
+            # The gate downsamples anyway, the lores stream is enough
+            self.motion_gate.update(published.native_at_least(self.motion_gate.width), now)
+        elif self._held_segments:
+            # Saving stopped: no later segment will decide the held ones
+            self._decide_held(flush=True)
+
+        self._buffer_frame(now, frame, slot, frame_in_slot=frame is out)
+
+    def _fit_lores_size(self, width, height):
+        """Keep the emulated lores width, with the height of the main
+        stream's aspect ratio (even, for the encoders)."""
+        self._lores_fitted = True
+        if self.lores_size is None:
+            return
+        lores_w = self.lores_size[0]
+        lores_h = max(2, round(lores_w * height / width / 2) * 2)
+        if (lores_w, lores_h) != self.lores_size:
+            print(f"[{self.name}] main stream is {width}x{height}, lores stream {lores_w}x{lores_h}")
+            self.lores_size = (lores_w, lores_h)
+
+    def _grab_compressed_frame(self):
+        """Read one JPEG frame, publish it undecoded and append it to the encoded ring."""
+        ret, jpeg = self.cap.read_compressed()
+        # Reject truncated payloads here rather than in a consumer's decode
+        size = jpeg_size(jpeg) if ret else None
+        if size is None:
+            self.dropped_frames += 1
+            return
+        if not self._lores_fitted:
+            self._fit_lores_size(*size)
+        now = time.time()
+        with self._latest_lock:
+            self.latest_seq += 1
+            frame = Frame.from_jpeg(self.latest_seq, time.monotonic(), jpeg, wall_time=now,
+                                    lores_size=self.lores_size)
+            self.latest = frame
+
+        if self.frame_bus_slots:
+            # Forces a decode of every frame, only enable if a process reads it
+            self._publish_to_bus(frame)
+
+        if self.thumbnails is not None and self.saving:
+            self.thumbnails.offer(frame, now)
+        if self.timelapse is not None and self.saving:
+            self.timelapse.offer(frame, now)
+
+        if self.motion_gate is not None and self._persist_segments():
+            # The gate downsamples anyway, decode at reduced scale
+            self.motion_gate.update(frame.native_at_least(self.motion_gate.width), now)
+        elif self._held_segments:
+            self._decide_held(flush=True)
+
+        seq = self._encode_seq
+        self._encode_seq += 1
+        self._add_encoded(seq, now, jpeg)
+
+    def _publish_to_bus(self, frame: Frame):
+        image = frame.native if self.frame_bus_stream == BUS_STREAM_MAIN else frame.lores
+        if self.frame_bus is None:
+            height, width = image.shape[:2]
+            self.frame_bus = FrameBus(
+                self.frame_bus_slots, height, width,
+                name=f"seedo_{self.name}_{self.frame_bus_stream}"
+            )
+            print(f"Frame bus {self.frame_bus.name}: {self.frame_bus_slots} slots of {width}x{height}")
+        if not self.frame_bus.publish(image, frame.seq, frame.timestamp, frame.wall_time or 0.0):
+            print("Frame bus: frame size changed, not published")
+
+    def frame_bus_handle(self) -> FrameBusHandle | None:
+        """Handle to pass to a child process (FrameBusReader), None until the
+        first frame has been published."""
+        return self.frame_bus.handle() if self.frame_bus is not None else None
+
+    def _buffer_frame(self, now, frame, slot, frame_in_slot=False):
+        """Commit a captured frame to the ring and queue full segments."""
+        if self.ring is None:
+            height, width = frame.shape[:2]
+            if self.buffer_mode == BUFFER_MODE_JPEG:
+                capacity = self.encode_workers * 2 + 2
+            else:
+                capacity = self.max_frames * self.ring_segments
+            self.ring = FrameRingBuffer(capacity, height, width)
+            print(f"Allocated frame ring: {self.ring.capacity} frames, "
+                  f"{self.ring.nbytes / (1024*1024):.0f} MB")
+            slot = self.ring.next_slot()
+
+        if slot is None and self.buffer_mode == BUFFER_MODE_RAW and self._persist_segments():
+            slot = self._slot_after_overflow()
+        if slot is None:
+            # Every free slot is leased by the save worker (or the encoders);
+            # keep the preview alive but skip buffering this frame.
+            self.dropped_frames += 1
+            return
+
+        if not frame_in_slot:
+            if frame.shape != self.ring.frame_shape:
+                self.dropped_frames += 1
+                return
+            np.copyto(self.ring.frames[slot], frame)
+        self.ring.commit(slot, now)
+
+        if self.buffer_mode == BUFFER_MODE_JPEG:
+            seq = self._encode_seq
+            self._encode_seq += 1
+            self.encode_pool.submit(self._encode_worker, seq, self.ring.lease(slot, 1))
+            return
+
+        if self.ring.write_count % self.max_frames == 0:
+            if not self._persist_segments():
+                return
+            self._initiate_saving()
+
+    def _slot_after_overflow(self) -> int | None:
+        """The next raw ring slot is still leased by a pending save: apply
+        the overflow policy. Returns the slot once free, None to drop the frame."""
+        self._ring_backed_up = True
+        if self.overflow_policy == OVERFLOW_DROP_OLDEST:
+            # The next slot belongs to the oldest buffered segment, which can
+            # be dropped if it is still queued rather than being written
+            try:
+                oldest = self.save_queue.get_nowait()
+            except Empty:
+                oldest = None
+            else:
+                self._drop_segment(oldest)
+                self.save_queue.task_done()
+            slot = self.ring.next_slot()
         else:
-            return self.latest_frame
+            # Bounded: segments held by the motion gate only move on when
+            # capture submits the next one
+            deadline = time.monotonic() + self.buffer_seconds
+            slot = self.ring.next_slot()
+            while slot is None and time.monotonic() < deadline and not self._stop_event.is_set():
+                self._stop_event.wait(RING_WAIT_POLL_SEC)
+                slot = self.ring.next_slot()
+        if slot is None:
+            self.save_stats.record_ring_full()
+        return slot
+
+    def _persist_segments(self) -> bool:
+        """Whether completed segments should be written to disk."""
+        return self.saving and self.recording_mode == RECORDING_MODE_CONTINUOUS
+
+    def _encode_worker(self, seq, lease: FrameLease):
+        """Encoder pool task: JPEG-encode one staged frame into the encoded ring."""
+        ts, jpeg = lease[0][0], None
+        try:
+            jpeg = self._encode_jpeg(lease.frames[0])
+        except Exception as err:
+            print("JPEG encode failed:", err)
+        finally:
+            lease.release()
+        self._add_encoded(seq, float(ts), jpeg)
+
+    def _add_encoded(self, seq, ts, jpeg):
+        """Append a JPEG frame to the encoded ring and queue completed segments."""
+        for segment in self.encoded_ring.add(seq, ts, jpeg):
+            if self._persist_segments():
+                print(f"\nQueueing save job for {len(segment)} encoded frames...")
+                self._submit_segment(FrameSegment(segment))
+
+    def _encode_jpeg(self, frame: np.ndarray, quality=None) -> bytes | None:
+        quality = self.jpeg_quality if quality is None else quality
+        ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            return None
+        return encoded.tobytes()
 
     def _initiate_saving(self):
-        """Copy buffer safely and queue work for save thread."""
+        """Lease the segment just completed and queue it for the save thread."""
+        start_slot = (self.ring.write_count - self.max_frames) % self.ring.capacity
+        lease = self.ring.lease(start_slot, self.max_frames)
+        print(f"\nQueueing save job for {len(lease)} frames...")
+        self._submit_segment(FrameSegment.from_lease(lease))
+
+    def _submit_segment(self, segment: FrameSegment):
+        """Send a completed segment to the save queue, through the motion gate if set."""
+        if self.motion_gate is None:
+            self._queue_segment(segment)
+            return
+
+        with self._held_lock:
+            self._held_segments.append(segment)
+        self._decide_held()
+
+    def _decide_held(self, flush=False):
+        """Queue or drop held segments the motion gate can decide on. With
+        flush=True every held segment is decided on the motion seen so far,
+        so none keeps its ring lease once saving has stopped."""
+        decided = []
+        with self._held_lock:
+            # Far enough in the future that no segment has to wait
+            now = math.inf if flush else time.time()
+            while self._held_segments:
+                held = self._held_segments[0]
+                decision = self.motion_gate.decide(held.start, held.end, now)
+                if decision == DECISION_WAIT:
+                    break
+                decided.append((decision, self._held_segments.popleft()))
 
-        buffer_copy = self.buffer[:]
-        self.buffer.clear()
-        print(f"\nQueueing save job for {len(buffer_copy)} frames...")
-        self.save_queue.put(buffer_copy)
+        for decision, held in decided:
+            if decision == DECISION_SAVE:
+                self._queue_segment(held)
+                continue
+            self.save_stats.record_idle()
+            if self.idle_keyframe_interval_sec:
+                self._queue_segment(held.subsample(self.idle_keyframe_interval_sec))
+            else:
+                held.release()
+
+    def _queue_segment(self, segment: FrameSegment):
+        """Put a segment on the bounded save queue, applying the overflow policy."""
+        self.save_stats.record_queued()
+        if self.overflow_policy != OVERFLOW_DROP_OLDEST:
+            self.save_queue.put(segment)
+            return
 
-    def _save_worker(self):
-        """Thread worker that waits for buffer copies and writes them to disk."""
         while True:
-            buffer_copy = self.save_queue.get()
-            if buffer_copy is None:
-                break
-            self._save_buffer_internal(buffer_copy)
+            try:
+                self.save_queue.put_nowait(segment)
+                return
+            except Full:
+                pass
+            try:
+                oldest = self.save_queue.get_nowait()
+            except Empty:
+                continue
+            self._drop_segment(oldest)
             self.save_queue.task_done()
 
-    def _save_buffer_internal(self, buffer_copy):
-        """Write buffer copy to AVI file."""
+    def _drop_segment(self, segment):
+        if segment is None:
+            # Shutdown sentinel, put it back for a worker
+            self.save_queue.put_nowait(None)
+            return
+        print(f"Save queue full, dropping segment of {len(segment)} frames")
+        self.save_stats.record_dropped(len(segment))
+        segment.release()
+
+    def _save_worker(self):
+        """Thread worker that waits for segments and writes them to disk."""
+        while True:
+            segment = self.save_queue.get()
+            if segment is None:
+                self.save_queue.task_done()
+                break
+            quality = None
+            backed_up = self._ring_backed_up or self.save_queue.qsize() * 2 >= self.save_queue.maxsize
+            self._ring_backed_up = False
+            if self.overflow_policy == OVERFLOW_REDUCE_QUALITY and backed_up:
+                quality = min(OVERFLOW_JPEG_QUALITY, self.jpeg_quality)
+            try:
+                self._save_buffer_internal(segment, quality)
+            except Exception as err:
+                self.save_stats.record_failed()
+                print("Save worker failed:", err)
+            finally:
+                segment.release()
+                self.save_queue.task_done()
+
+    def _save_buffer_internal(self, buffer_copy: FrameSegment, quality=None):
+        """Write a segment to an MJPEG AVI file.
+
+        Raw frames (backed by a ring lease) are JPEG-encoded here, at quality
+        instead of jpeg_quality when the save queue is backed up. Frames from
+        the encoded ring are already JPEG and are written as-is.
+        """
         print(f"Save worker: writing {len(buffer_copy)} frames...")
 
         t0 = time.time()
         start_time = buffer_copy[0][0]
         end_time = buffer_copy[-1][0]
-        filename = f"camera_{int(start_time)}_{int(end_time)}.avi"
-
-        BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        data_dir = os.path.join(BASE_DIR, CAM_DATA_DIR)
-
-        os.makedirs(data_dir, exist_ok=True)
-        filepath = os.path.join(data_dir, filename)
-
-
-        sample_frame = buffer_copy[0][1]
-        height, width, _ = sample_frame.shape
-
-        out = cv2.VideoWriter(
-            filepath,
-            cv2.VideoWriter_fourcc(*"MJPG"),
-            self.target_fps,
-            (width, height)
-        )
-
-        for ts, frame in buffer_copy:
-            out.write(frame)
+        # Millisecond names so sub-second segments never collide
+        filename = f"camera_{int(start_time * 1000)}_{int(end_time * 1000)}.avi"
+
+        os.makedirs(self.data_dir, exist_ok=True)
+        filepath = os.path.join(self.data_dir, filename)
+
+        reduced = False
+        self._add_live_file(filepath, start_time, end_time)
+        try:
+            with MjpegAviWriter(filepath, self.target_fps, live=True) as out:
+                for ts, frame in buffer_copy:
+                    if isinstance(frame, bytes):
+                        jpeg = frame
+                    else:
+                        jpeg = self._encode_jpeg(frame, quality)
+                        reduced = quality is not None
+                    if jpeg is not None:
+                        out.write_frame(jpeg, float(ts))
+            self._register_recording(out, KIND_SEGMENT)
+        finally:
+            self._remove_live_file(filepath)
 
-        out.release()
         elapsed = time.time() - t0
+        self.save_stats.record_written(out.frame_count, elapsed, reduced)
         print(f"Saved {filename} in {elapsed:.2f} seconds\n")
 
-    def clear_old_videos(self):
-        """Spawn a background thread to clean old video files."""
-        now = time.time()
-        if now - self.last_video_clear > self.video_retention_time_sec:
-            self.last_video_clear = now
-            threading.Thread(
-                target=self._clear_old_video_worker,
-                daemon=True
-            ).start()
-
-    def _clear_old_video_worker(self):
-        """Delete video clips older than retention threshold."""
-        cutoff = time.time() - self.video_retention_time_sec
-
-        BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        data_dir = os.path.join(BASE_DIR, CAM_DATA_DIR)
-
-        all_files = [
-            f for f in os.listdir(data_dir)
-            if f.startswith("camera_") and f.endswith(".avi")
-        ]
-
-        removed_count = 0
-        removed_bytes = 0
-
-        for f in all_files:
-            try:
-                _, s, e = f[:-4].split("_")
-                end_ts = float(e)
-            except:
-                continue
-
-            if end_ts < cutoff:
-                filepath = os.path.join(data_dir, f)
-                try:
-                    file_size = os.path.getsize(filepath)
-                    os.remove(filepath)
-                    removed_count += 1
-                    removed_bytes += file_size
-                    print(f"Deleted old video: {filepath}")
-                except Exception as err:
-                    print("Failed to remove:", filepath, "Error:", err)
-
-        if removed_count > 0:
-            print(f"Cleanup complete: {removed_count} files removed "
-                f"({removed_bytes / (1024*1024):.2f} MB freed)")
-        else:
-            print("Cleanup complete: no old files found.")
-
     def _list_video_files_by_time(self, start: float, end: float) -> List[str]:
-        """Return full paths to video files whose timestamps overlap [start, end]."""
-        BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        data_dir = os.path.join(BASE_DIR, CAM_DATA_DIR)
-
-        all_files = [
-            f for f in os.listdir(data_dir)
-            if f.startswith("camera_") and f.endswith(".avi")
-        ]
-
-        matched = []
-        for f in all_files:
-            try:
-                # f = camera_<start>_<end>.avi
-                _, s, e = f[:-4].split("_")
-                start_ts = float(s)
-                end_ts = float(e)
-            except:
-                continue
-
-            # Overlap check
-            if end_ts >= start and start_ts <= end:
-                matched.append(os.path.join(data_dir, f))
-
-        return sorted(matched)
-
-    def combine_avi_segments(self, output_path, avi_files, fps=15):
-
-        if not avi_files:
+        """Return full paths to segments whose timestamps overlap [start, end],
+        oldest first, including files that are still being written."""
+        spans = {self.catalog.full_path(r): r.start for r in self.catalog.overlapping(start, end)}
+        with self._live_lock:
+            for path, (live_start, live_end) in self._live_files.items():
+                if live_start <= end and live_end >= start:
+                    spans.setdefault(path, live_start)
+        return sorted(spans, key=spans.get)
+
+    def _add_live_file(self, path, start, end):
+        with self._live_lock:
+            self._live_files[path] = (start, end)
+
+    def _remove_live_file(self, path):
+        with self._live_lock:
+            self._live_files.pop(path, None)
+
+    def _register_recording(self, writer: MjpegAviWriter, kind: str, path: str | None = None):
+        """Add a finalized file to the segment catalog."""
+        path = path or writer.path
+        if writer.frame_count == 0 or not os.path.exists(path):
+            return
+        timestamps = writer.timestamps
+        self.catalog.add(SegmentRecord(
+            filename=os.path.relpath(path, self.data_dir),
+            start=timestamps[0] if timestamps else 0.0,
+            end=timestamps[-1] if timestamps else 0.0,
+            frame_count=writer.frame_count,
+            size_bytes=os.path.getsize(path),
+            kind=kind,
+            frame_offsets=writer.frame_offsets() if path == writer.path else []
+        ))
+        if self.retention.policy.max_total_bytes is not None:
+            self.retention.wake()
+
+    def combine_avi_segments(self, output_path, avi_files, fps=15, start=None, end=None, kind=None,
+                             tail_source: Callable[[float], List[tuple[float, bytes]]] | None = None,
+                             playback_fps: float | None = None):
+        """Concatenate MJPEG AVI segments by copying JPEG chunks, no decode/re-encode.
+
+        Frames are trimmed to [start, end] using the per-frame timestamps
+        stored by MjpegAviWriter, or timestamps interpolated from the file
+        name for older segments. Files still being written contribute the
+        frames written so far. tail_source(after_ts) can supply (ts, jpeg)
+        frames newer than the files, e.g. from the in-memory buffer; frames
+        are only ever appended in timestamp order. If output_path ends in .mp4 the result is
+        remuxed with a stream-copy muxer when one is available, otherwise an
+        .avi is written next to it. If kind is given the result is added to
+        the segment catalog. playback_fps overrides the frame rate derived
+        from the timestamps. Returns the path actually written.
+        """
+        if not avi_files and tail_source is None:
             print("No files provided to combine.")
             return None
 
-        # Determine frame size from the first video
-        cap = cv2.VideoCapture(avi_files[0])
-        if not cap.isOpened():
-            print("Failed to open:", avi_files[0])
-            return None
-
-        width  = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        cap.release()
-
-        writer = cv2.VideoWriter(
-            output_path,
-            cv2.VideoWriter_fourcc(*"mp4v"),
-            fps,
-            (width, height)
-        )
-
-        # Append frames sequentially
-        for filename in avi_files:
-            print("Appending:", filename)
-            cap = cv2.VideoCapture(filename)
-
-            if not cap.isOpened():
-                print("Skipping unreadable file:", filename)
-                continue
-
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                writer.write(frame)
-
-            cap.release()
+        want_mp4 = output_path.lower().endswith(".mp4")
+        avi_path = os.path.splitext(output_path)[0] + ".avi"
 
-        writer.release()
-        print("Done combining:", output_path)
-        return output_path
+        last_ts = float("-inf") if start is None else start - 1e-6
+        with MjpegAviWriter(avi_path, fps, playback_fps=playback_fps) as writer:
+            for filename in avi_files:
+                print("Appending:", filename)
+                try:
+                    reader = MjpegAviReader(filename)
+                except (OSError, ValueError) as err:
+                    print("Skipping unreadable file:", filename, err)
+                    continue
+
+                with reader:
+                    timestamps = reader.frame_timestamps(self._segment_start_from_name(filename))
+                    for i, ts in enumerate(timestamps):
+                        if ts <= last_ts:
+                            continue
+                        if end is not None and ts > end:
+                            break
+                        writer.write_frame(reader.read_frame(i), ts)
+                        last_ts = ts
+
+            if tail_source is not None:
+                for ts, jpeg in tail_source(last_ts):
+                    if ts <= last_ts:
+                        continue
+                    if end is not None and ts > end:
+                        break
+                    writer.write_frame(jpeg, ts)
+                    last_ts = ts
+
+        if writer.frame_count == 0:
+            os.remove(avi_path)
+            print("No frames in requested window.")
+            return None
 
+        if want_mp4:
+            if remux_stream_copy(avi_path, output_path):
+                os.remove(avi_path)
+                if kind:
+                    self._register_recording(writer, kind, output_path)
+                print("Done combining:", output_path)
+                return output_path
+            print("No stream-copy muxer available, keeping AVI.")
+
+        if kind:
+            self._register_recording(writer, kind)
+        print("Done combining:", avi_path)
+        return avi_path
+
+    @staticmethod
+    def _segment_start_from_name(path) -> float | None:
+        """Start time encoded in camera_<start>_<end>.avi, None if unparsable.
+
+        Older segments are named in seconds, newer ones in milliseconds.
+        """
+        try:
+            _, s, _ = os.path.basename(path)[:-4].split("_")
+            start = float(s)
+        except ValueError:
+            return None
+        return start / 1000 if start > 1e11 else start
 
     def get_and_combine_past_video(self, length, time_end):
         """
         Determine which AVI files overlap the desired time window and
         call an existing combine helper to merge them.
+
+        If time_end is in the future this waits until then. Frames not yet
+        in a finished file come from the files still being written and from
+        the in-memory buffer, so the clip reaches up to the current frame.
         """
         target_end = time_end
         target_start = target_end - length
 
-        selected = self._list_video_files_by_time(target_start, target_end)
+        # One frame period of slack so the frame at time_end has been captured
+        wait = target_end + 1 / self.target_fps - time.time()
+        if wait > 0:
+            self._stop_event.wait(wait)
 
+        selected = self._list_video_files_by_time(target_start, target_end)
         if not selected:
-            print("No segments found in range.")
-            return None
-
-        selected.sort()  # chronological
+            print("No segments found in range, using buffered frames only.")
 
         outfile = os.path.join(
-            os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
-            CAM_DATA_DIR,
+            self.data_dir,
             f"combined_{int(target_start)}_{int(target_end)}.mp4"
         )
 
-        return self.combine_avi_segments(outfile, selected)
+        return self.combine_avi_segments(
+            outfile, selected, start=target_start, end=target_end, kind=KIND_EVENT,
+            # Only frames newer than the last one on disk are read from memory
+            tail_source=lambda after: self._buffered_jpeg_frames(after, target_end)
+        )
+
+    # -------- EVENT CLIPS --------
+    def record_event_clip(self, trigger_time, pre_seconds=10, post_seconds=5) -> str | None:
+        """Write [trigger_time - pre_seconds, trigger_time + post_seconds] to one clip.
+
+        The pre-roll comes from the in-memory buffer, the post-roll is
+        appended as it is captured. Blocks until the clip is finalized and
+        returns its path, or None if no frames were available.
+        """
+        clip_start = trigger_time - pre_seconds
+        clip_end = trigger_time + post_seconds
+
+        os.makedirs(self.data_dir, exist_ok=True)
+        filepath = os.path.join(
+            self.data_dir, f"event_{int(clip_start * 1000)}_{int(clip_end * 1000)}.avi"
+        )
+        writer = MjpegAviWriter(filepath, self.target_fps, live=True)
+        self._add_live_file(filepath, clip_start, clip_end)
+        last_ts = clip_start
+        # Give up on the post-roll if the camera stops delivering frames
+        give_up_at = time.time() + post_seconds + 2 * self.buffer_seconds
+
+        while True:
+            for ts, jpeg in self._buffered_jpeg_frames(last_ts, clip_end):
+                if writer.frame_count == 0 and ts > clip_start + 1:
+                    print(f"Event clip pre-roll is {trigger_time - ts:.1f}s, "
+                          f"{pre_seconds}s requested (buffer too short)")
+                writer.write_frame(jpeg, ts)
+                last_ts = ts
+            now = time.time()
+            if now >= clip_end and (last_ts >= clip_end - 1 / self.target_fps or now >= give_up_at):
+                break
+            self._stop_event.wait(0.25)
+            if self._stop_event.is_set():
+                break
+
+        if writer.frame_count == 0:
+            writer.abort()
+            self._remove_live_file(filepath)
+            print("No buffered frames for event clip.")
+            return None
+        writer.close()
+        self._register_recording(writer, KIND_EVENT)
+        self._remove_live_file(filepath)
+        print(f"Saved event clip {filepath} ({writer.frame_count} frames)")
+        return filepath
+
+    def _buffered_jpeg_frames(self, after, end) -> List[tuple[float, bytes]]:
+        """JPEG frames still held in memory with after < timestamp <= end."""
+        if self.buffer_mode == BUFFER_MODE_JPEG:
+            return self.encoded_ring.window(after, end)
+
+        frames = []
+        if self.ring is None:
+            return frames
+        # Lease a few frames at a time so capture keeps free slots while
+        # this thread encodes
+        while True:
+            leases = self.ring.lease_window(after, end, max_frames=BUFFERED_ENCODE_CHUNK)
+            if not leases:
+                return frames
+            for lease in leases:
+                try:
+                    for ts, frame in lease:
+                        jpeg = self._encode_jpeg(frame)
+                        if jpeg is not None:
+                            frames.append((float(ts), jpeg))
+                        after = max(after, float(ts))
+                finally:
+                    lease.release()
 
     def release(self):
         self.active = False
-        self.save_queue.put(None)
+        self._stop_event.set()
+        self.retention.stop()
+        if self.capture_thread is not None:
+            self.capture_thread.join(timeout=2)
+        if self.encode_pool is not None:
+            self.encode_pool.shutdown(wait=True)
+        with self._held_lock:
+            while self._held_segments:
+                self._held_segments.popleft().release()
+        for _ in self.save_threads:
+            self.save_queue.put(None)
         if self.cap and self.cap.isOpened():
             self.cap.release()
+        if self.frame_bus is not None:
+            self.frame_bus.close()
+        if self.timelapse is not None:
+            self.timelapse.close()
 
 
 if __name__ == "__main__":
@@ -286,7 +897,7 @@ if __name__ == "__main__":
     print(f"  TIME_IN_PAST= {TIME_IN_PAST}")
 
     # We don't actually need the camera; we just reuse the class logic.
-    cam = CameraManager(target_fps=15)
+    cam = CameraManager(target_fps=15, threaded_capture=False)
 
     combined_path = cam.get_and_combine_past_video(
         length=LENGTH_SEC,
@@ -1,22 +1,49 @@
 from core.secrets import get_secret
 import numpy as np
 import cv2
+import json
+import os
+import time
 from typing import TYPE_CHECKING
 
-def get_camera_pipeline():
-  CAMERA_TYPE = get_secret('CAMERA_TYPE')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+def get_camera_pipeline(camera_type=None):
+  CAMERA_TYPE = camera_type or get_secret('CAMERA_TYPE')
   HEIGHT = get_secret('HEIGHT')
   WIDTH = get_secret('WIDTH')
   print(CAMERA_TYPE)
   if CAMERA_TYPE == "PI":
     return CameraCapturePi
+  elif CAMERA_TYPE == "FILE":
+    return CameraCaptureFile
+  elif CAMERA_TYPE == "SYNTHETIC":
+    return CameraCaptureSynthetic
   else:
     return CameraCaptureUSB
 
 class CameraCapture:
-    def read(self) -> tuple[bool, np.ndarray]:
+    # True when read_compressed() hands back the camera's own JPEG bytes
+    compressed = False
+    # True when frames are delivered upside down relative to the sensor
+    # (and to any calibration done on unflipped frames)
+    vflip = False
+
+    def read(self, out: np.ndarray | None = None) -> tuple[bool, np.ndarray]:
+        """Read a BGR frame. If out is given the frame is written into it when
+        the shapes match, otherwise a new array is returned."""
+        raise NotImplementedError
+
+    def read_compressed(self) -> tuple[bool, bytes | None]:
+        """Read one frame as JPEG bytes without decoding it."""
         raise NotImplementedError
 
+    def read_lores(self) -> np.ndarray | None:
+        """BGR lores stream of the frame returned by the last read(), None if
+        the camera has no second stream (the lores view is then downscaled
+        from main in software). Constructors take lores_size=(w, h)."""
+        return None
+
     def release(self):
         raise NotImplementedError
     
@@ -31,9 +58,26 @@ class CameraCapture:
     
 
 class CameraCaptureUSB(CameraCapture):
-  def __init__(self, desired_width, desired_height, device_index=0):
+  """OpenCV VideoCapture camera.
+
+  With CAMERA_COMPRESSED=true the camera is put in MJPG mode and OpenCV's
+  decode is switched off, so read_compressed() returns the JPEG bytes the
+  camera sent. They go to recordings untouched and are only decoded when
+  something needs pixels. Falls back to decoded capture if the backend
+  can't deliver the raw stream.
+  """
+  def __init__(self, desired_width, desired_height, device_index=0, compressed=None, lores_size=None,
+               fourcc=None, fps=None):
          #select_and_configure_camera()
         self.cap = cv2.VideoCapture(device_index)
+        want_compressed = compressed if compressed is not None else get_secret('CAMERA_COMPRESSED') == 'true'
+        # MJPG keeps USB bandwidth low enough for 30 fps at 720p
+        fourcc = fourcc or ("MJPG" if want_compressed else None)
+        if fourcc:
+          self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+        want_compressed = want_compressed and fourcc == "MJPG"
+        if fps:
+          self.cap.set(cv2.CAP_PROP_FPS, fps)
 
         # set camera resolution, this will fail silently if unsupported
         self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, desired_width)
@@ -43,12 +87,41 @@ class CameraCaptureUSB(CameraCapture):
         self.actual_height = self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
         print("Actual camera resolution:", self.cap.get(cv2.CAP_PROP_FRAME_WIDTH), "x", self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
 
+        self.compressed = want_compressed and self._enable_passthrough()
+
+  def _enable_passthrough(self) -> bool:
+    """Ask the backend for undecoded MJPEG and check that it delivers it."""
+    self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+    # V4L2: -1 selects raw mode, the buffer is the compressed payload
+    self.cap.set(cv2.CAP_PROP_FORMAT, -1)
+    ok, buf = self.cap.read()
+    if ok and buf is not None and self._is_jpeg(buf):
+      print("[USB CAMERA] compressed passthrough enabled")
+      return True
+    print("[USB CAMERA] backend does not deliver raw MJPEG, decoding frames instead")
+    self.cap.set(cv2.CAP_PROP_FORMAT, 0)
+    self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 1)
+    return False
+
+  @staticmethod
+  def _is_jpeg(buf: np.ndarray) -> bool:
+    flat = buf.reshape(-1)
+    return buf.dtype == np.uint8 and flat.size > 4 and flat[0] == 0xFF and flat[1] == 0xD8
+
+  def read_compressed(self):
+    ok, buf = self.cap.read()
+    if not ok or buf is None:
+      return False, None
+    return True, buf.tobytes()
+
   def set(self):
     """probably not needed, can just do instance.cap.set"""
     pass
    
-  def read(self):
-    return self.cap.read()
+  def read(self, out=None):
+    if out is None:
+      return self.cap.read()
+    return self.cap.read(out)
    
   def isOpened(self):
     return self.cap.isOpened()
@@ -58,18 +131,32 @@ class CameraCaptureUSB(CameraCapture):
   
 
 class CameraCapturePi(CameraCapture):    
-    def __init__(self, desired_width, desired_height, device_index=0):
+    def __init__(self, desired_width, desired_height, device_index=0, lores_size=None, fps=None):
         from picamera2 import Picamera2
         from libcamera import Transform
 
-        self.cap = Picamera2()
+        # device_index selects the sensor on boards with several cameras
+        self.cap = Picamera2(device_index)
 
         self._is_open = True
+        self.lores_size = lores_size
+        self._last_lores = None
+        self.vflip = True
 
-        # Create configuration using requested size
+        # Create configuration using requested size. The ISP scales the
+        # optional lores stream in hardware; YUV420 is the lores format
+        # every Pi model supports.
+        streams = {"main": {"size": (desired_width, desired_height),  "format":'RGB888'}}  # width, height
+        if lores_size:
+          streams["lores"] = {"size": tuple(lores_size), "format": 'YUV420'}
+        controls = {}
+        if fps:
+          frame_us = int(1_000_000 / fps)
+          controls["FrameDurationLimits"] = (frame_us, frame_us)
         config = self.cap.create_preview_configuration(
-          transform=Transform(vflip=True) ,
-          main={"size": (desired_width, desired_height),  "format":'RGB888'}  # width, height
+          transform=Transform(vflip=self.vflip) ,
+          controls=controls,
+          **streams
         )
 
         # Align configuration to hardware-supported modes
@@ -86,10 +173,23 @@ class CameraCapturePi(CameraCapture):
     def set(self, *args, **kwargs):
         return True   # maybe useful in future
 
-    def read(self):
-        frame = self.cap.capture_array()
+    def read(self, out=None):
+        if self.lores_size:
+            # Both streams from the same request so they show the same instant
+            (frame, lores), _ = self.cap.capture_arrays(["main", "lores"])
+            self._last_lores = lores
+        else:
+            frame = self.cap.capture_array()
+        if out is not None and out.shape == frame.shape:
+            np.copyto(out, frame)
+            return True, out
         return True, frame
 
+    def read_lores(self):
+        if self._last_lores is None:
+            return None
+        return cv2.cvtColor(self._last_lores, cv2.COLOR_YUV2BGR_I420)
+
     def isOpened(self):
         return self._is_open
 
@@ -99,4 +199,201 @@ class CameraCapturePi(CameraCapture):
         self.cap.stop()
         self.cap.close()
 
-    
\ No newline at end of file
+    
+
+
+class CameraCaptureFile(CameraCapture):
+    """Replay a video file or a directory of images as if it were a camera.
+
+    Configured through .env when selected with CAMERA_TYPE=FILE:
+      CAMERA_SOURCE   path to a video file or an image directory
+      CAMERA_REALTIME 'false' to deliver frames as fast as possible
+      CAMERA_LOOP     'false' to stop at the end instead of rewinding
+    Frames are resized to the requested size if they differ.
+    """
+    def __init__(self, desired_width, desired_height, device_index=0,
+                 source=None, realtime=None, loop=None, fps=30, lores_size=None):
+        self.width = desired_width
+        self.height = desired_height
+        self.source = source or get_secret('CAMERA_SOURCE')
+        if not self.source:
+            raise ValueError("CameraCaptureFile needs a source (set CAMERA_SOURCE)")
+        self.realtime = realtime if realtime is not None else get_secret('CAMERA_REALTIME') != 'false'
+        self.loop = loop if loop is not None else get_secret('CAMERA_LOOP') != 'false'
+
+        self._video = None
+        self._images = []
+        self._image_index = 0
+        if os.path.isdir(self.source):
+            self._images = sorted(
+                os.path.join(self.source, f) for f in os.listdir(self.source)
+                if f.lower().endswith(IMAGE_EXTENSIONS)
+            )
+            if not self._images:
+                raise ValueError(f"No images found in {self.source}")
+            self.fps = fps
+        else:
+            self._video = cv2.VideoCapture(self.source)
+            if not self._video.isOpened():
+                raise ValueError(f"Could not open video {self.source}")
+            self.fps = self._video.get(cv2.CAP_PROP_FPS) or fps
+
+        self.frames_delivered = 0
+        self._is_open = True
+        self._next_frame_time = time.monotonic()
+        print(f"[FILE CAMERA] {self.source} at {self.fps:.1f} fps, realtime={self.realtime}")
+
+    def _next_source_frame(self):
+        if self._video is not None:
+            ret, frame = self._video.read()
+            if not ret and self.loop:
+                self._video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ret, frame = self._video.read()
+            return ret, frame
+
+        if self._image_index >= len(self._images):
+            if not self.loop:
+                return False, None
+            self._image_index = 0
+        frame = cv2.imread(self._images[self._image_index], cv2.IMREAD_COLOR)
+        self._image_index += 1
+        return frame is not None, frame
+
+    def read(self, out=None):
+        if not self._is_open:
+            return False, None
+
+        if self.realtime:
+            delay = self._next_frame_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._next_frame_time = max(self._next_frame_time + 1 / self.fps, time.monotonic())
+
+        ret, frame = self._next_source_frame()
+        if not ret:
+            return False, None
+
+        if frame.shape[1] != self.width or frame.shape[0] != self.height:
+            if out is not None and out.shape == (self.height, self.width, 3):
+                cv2.resize(frame, (self.width, self.height), dst=out, interpolation=cv2.INTER_AREA)
+                frame = out
+            else:
+                frame = cv2.resize(frame, (self.width, self.height), interpolation=cv2.INTER_AREA)
+        elif out is not None and out.shape == frame.shape:
+            np.copyto(out, frame)
+            frame = out
+
+        self.frames_delivered += 1
+        return True, frame
+
+    def set(self, *args, **kwargs):
+        return True
+
+    def isOpened(self):
+        return self._is_open
+
+    def release(self):
+        self._is_open = False
+        if self._video is not None:
+            self._video.release()
+
+
+class CameraCaptureSynthetic(CameraCapture):
+    """Generate a scripted scene for deterministic tests and benchmarks.
+
+    The scene is a static gradient background plus objects that appear in
+    given regions for given time windows, e.g. a box appearing in an ROI.
+    Time is wall-clock since start in realtime mode, and frame_index / fps
+    otherwise, so a fast run produces the same frames every time.
+
+    A script can be passed directly or as JSON in CAMERA_SCRIPT:
+      [{"start": 5, "end": 10, "roi": [x1, y1, x2, y2], "color": [b, g, r]}]
+    """
+    DEFAULT_SCRIPT = [
+        {"start": 5.0, "end": 10.0, "roi": [0.4, 0.4, 0.6, 0.6], "color": [30, 30, 200]},
+    ]
+
+    def __init__(self, desired_width, desired_height, device_index=0,
+                 script=None, realtime=None, fps=30, noise=0, seed=0, lores_size=None):
+        self.width = desired_width
+        self.height = desired_height
+        self.fps = fps
+        self.realtime = realtime if realtime is not None else get_secret('CAMERA_REALTIME') != 'false'
+
+        if script is None:
+            raw = get_secret('CAMERA_SCRIPT')
+            script = json.loads(raw) if raw else self.DEFAULT_SCRIPT
+        self.script = [self._to_pixels(item) for item in script]
+
+        # Horizontal BGR gradient so the background is not a flat colour
+        ramp = np.linspace(40, 160, self.width, dtype=np.float32)
+        self._background = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        self._background[:] = np.stack([ramp, ramp * 0.8, ramp * 0.6], axis=-1).astype(np.uint8)
+
+        # A few precomputed noise patterns cycled per frame keep it cheap
+        self._noise = []
+        if noise:
+            self._background_i16 = self._background.astype(np.int16)
+            rng = np.random.default_rng(seed)
+            self._noise = [
+                rng.integers(-noise, noise + 1, self._background.shape, dtype=np.int16)
+                for _ in range(4)
+            ]
+
+        self.frame_index = 0
+        self._start_time = time.monotonic()
+        self._next_frame_time = self._start_time
+        self._is_open = True
+
+    def _to_pixels(self, item):
+        """Accept ROIs in pixels or normalized [0, 1] coordinates."""
+        x1, y1, x2, y2 = item["roi"]
+        if max(x1, y1, x2, y2) <= 1.0:
+            x1, x2 = x1 * self.width, x2 * self.width
+            y1, y2 = y1 * self.height, y2 * self.height
+        return {
+            "start": float(item["start"]),
+            "end": float(item["end"]),
+            "roi": (int(x1), int(y1), int(x2), int(y2)),
+            "color": tuple(int(c) for c in item.get("color", (0, 0, 255))),
+        }
+
+    def scene_time(self) -> float:
+        if self.realtime:
+            return time.monotonic() - self._start_time
+        return self.frame_index / self.fps
+
+    def read(self, out=None):
+        if not self._is_open:
+            return False, None
+
+        if self.realtime:
+            delay = self._next_frame_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._next_frame_time = max(self._next_frame_time + 1 / self.fps, time.monotonic())
+
+        frame = out if out is not None and out.shape == self._background.shape else np.empty_like(self._background)
+        if self._noise:
+            noise = self._noise[self.frame_index % len(self._noise)]
+            np.copyto(frame, np.clip(self._background_i16 + noise, 0, 255), casting='unsafe')
+        else:
+            np.copyto(frame, self._background)
+
+        t = self.scene_time()
+        for item in self.script:
+            if item["start"] <= t < item["end"]:
+                x1, y1, x2, y2 = item["roi"]
+                cv2.rectangle(frame, (x1, y1), (x2, y2), item["color"], thickness=-1)
+
+        self.frame_index += 1
+        return True, frame
+
+    def set(self, *args, **kwargs):
+        return True
+
+    def isOpened(self):
+        return self._is_open
+
+    def release(self):
+        self._is_open = False
@@ -0,0 +1,92 @@
+import json
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from pydantic import BaseModel, Field
+
+from core.camera_manager.camera_manager import CameraManager
+from core.camera_manager.constants import DEFAULT_CAMERA
+from core.camera_manager.motion_gate import MotionGate
+from core.camera_manager.retention import RetentionPolicy
+from core.secrets import get_secret
+
+
+class CameraConfig(BaseModel):
+    name: str = DEFAULT_CAMERA
+    device_index: int = 0
+    # Overrides CAMERA_TYPE for this camera (USB, PI, FILE, SYNTHETIC)
+    camera_type: Optional[str] = None
+    # Extra keyword arguments for the capture class, e.g. {"source": ...} for FILE
+    options: Dict[str, Any] = Field(default_factory=dict)
+
+
+def load_camera_configs() -> List[CameraConfig]:
+    """Cameras from the CAMERAS secret (a JSON list of CameraConfig), or a
+    single default camera when it is not set."""
+    raw = get_secret('CAMERAS')
+    if not raw:
+        return [CameraConfig()]
+    configs = [CameraConfig(**c) for c in json.loads(raw)]
+    names = [c.name for c in configs]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate camera names in CAMERAS: {names}")
+    return configs
+
+
+class CameraRegistry:
+    """Named CameraManagers, one per camera.
+
+    Every camera runs its own capture thread, ring buffer, save workers and
+    recording catalog. The first configured camera is the default one used
+    by the UI preview. Retention byte budgets are split evenly across cameras.
+    """
+    def __init__(self, configs: List[CameraConfig], retention_policy: RetentionPolicy | None = None,
+                 make_motion_gate: Callable[[], MotionGate] | None = None, **manager_kwargs):
+        if not configs:
+            raise ValueError("CameraRegistry needs at least one camera")
+        retention_policy = retention_policy or RetentionPolicy()
+
+        self._cameras: Dict[str, CameraManager] = {}
+        for config in configs:
+            policy = retention_policy.model_copy()
+            if policy.max_total_bytes is not None:
+                policy.max_total_bytes //= len(configs)
+            if policy.timelapse_max_bytes is not None:
+                policy.timelapse_max_bytes //= len(configs)
+            print(f"Starting camera '{config.name}' (device {config.device_index})")
+            self._cameras[config.name] = CameraManager(
+                name=config.name,
+                device_index=config.device_index,
+                camera_type=config.camera_type,
+                pipeline_options=config.options,
+                retention_policy=policy,
+                # Motion history is per camera, never share a gate
+                motion_gate=make_motion_gate() if make_motion_gate else None,
+                **manager_kwargs
+            )
+
+    def __len__(self):
+        return len(self._cameras)
+
+    def __contains__(self, name: str):
+        return name in self._cameras
+
+    def __iter__(self) -> Iterator[CameraManager]:
+        return iter(self._cameras.values())
+
+    def get(self, name: str) -> CameraManager | None:
+        return self._cameras.get(name)
+
+    def names(self) -> List[str]:
+        return list(self._cameras)
+
+    def items(self):
+        return self._cameras.items()
+
+    @property
+    def default(self) -> CameraManager:
+        return next(iter(self._cameras.values()))
+
+    def release(self):
+        for camera in self._cameras.values():
+            camera.active = False
+            camera.saving = False
+            camera.release()
@@ -0,0 +1,5 @@
+# Kept free of heavy imports (cv2, numpy) so config schemas can use them
+
+# Name of the camera used when only one is configured. Its recordings stay in
+# CAM_DATA_DIR, other cameras record to CAM_DATA_DIR/<name>.
+DEFAULT_CAMERA = 'default'
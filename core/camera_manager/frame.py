@@ -0,0 +1,185 @@
+import threading
+import weakref
+import cv2
+import numpy as np
+from PIL import Image
+
+from core.camera_manager.mjpeg_avi import jpeg_size
+
+# JPEG DCT scaling: decode straight to 1/n size, much cheaper than decoding
+# full size and resizing
+REDUCED_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+class Frame:
+    """One captured frame plus lazily computed, cached derived views.
+
+    The native buffer is the BGR array from the camera. Each derived view
+    (RGB, grayscale, resized copies, PIL image) is computed the first time
+    someone asks for it and then shared, so N consumers of the same frame
+    pay for each conversion once. Frames are immutable once published.
+
+    A frame captured in compressed passthrough mode only carries the
+    camera's JPEG bytes. It is decoded the first time pixels are needed,
+    and small views are decoded at reduced scale instead of full size.
+
+    Frames have two streams: the full-resolution main stream that is
+    recorded, and a low-resolution lores stream for analysis and preview.
+    The lores buffer comes from the camera when it has a second stream,
+    otherwise it is downscaled from main on first use.
+
+    native may be a recycled pool buffer, with lease keeping it reserved.
+    The lease is released when the last reference to the Frame goes away.
+    """
+    def __init__(self, seq: int, timestamp: float, native: np.ndarray | None = None,
+                 wall_time: float | None = None, jpeg: bytes | None = None,
+                 lores: np.ndarray | None = None, lores_size: tuple[int, int] | None = None,
+                 lease=None):
+        if native is None and jpeg is None:
+            raise ValueError("Frame needs a native buffer or JPEG bytes")
+        self.seq = seq
+        # time.monotonic() at capture
+        self.timestamp = timestamp
+        # time.time() at capture, used for recording / clip windows
+        self.wall_time = wall_time
+        # Compressed payload as delivered by the camera, None for raw frames
+        self.jpeg = jpeg
+        self._native = native
+        self._size = None if native is None else (native.shape[1], native.shape[0])
+        # Hardware lores buffer (BGR), None when it is emulated
+        self._lores = lores
+        # (width, height) of the lores stream, None = same as main
+        self.lores_size = (lores.shape[1], lores.shape[0]) if lores is not None else lores_size
+        self._cache = {}
+        # Views may be derived from other cached views
+        self._lock = threading.RLock()
+        if lease is not None:
+            weakref.finalize(self, lease.release)
+
+    @classmethod
+    def from_jpeg(cls, seq: int, timestamp: float, jpeg: bytes, wall_time: float | None = None,
+                  lores_size: tuple[int, int] | None = None) -> "Frame":
+        return cls(seq, timestamp, wall_time=wall_time, jpeg=jpeg, lores_size=lores_size)
+
+    @property
+    def native(self) -> np.ndarray:
+        """Full-resolution BGR pixels, decoded on first use for JPEG frames."""
+        if self._native is not None:
+            return self._native
+        return self._decode(1)
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        return self.height, self.width, 3
+
+    @property
+    def width(self) -> int:
+        return self._dimensions()[0]
+
+    @property
+    def height(self) -> int:
+        return self._dimensions()[1]
+
+    def _dimensions(self) -> tuple[int, int]:
+        if self._size is None:
+            # Read from the SOF header, no decode needed
+            self._size = jpeg_size(self.jpeg) or self.native.shape[1::-1]
+        return self._size
+
+    def _decode(self, factor: int) -> np.ndarray:
+        def compute():
+            data = np.frombuffer(self.jpeg, dtype=np.uint8)
+            image = cv2.imdecode(data, REDUCED_DECODE_FLAGS[factor])
+            if image is None:
+                raise ValueError(f"Could not decode JPEG for frame {self.seq}")
+            return image
+        return self._memo(("decoded", factor), compute)
+
+    def _source(self, width: int, height: int) -> np.ndarray:
+        """Cheapest BGR buffer that is still at least width x height."""
+        if (self._lores is not None and self._lores.shape[1] >= width
+                and self._lores.shape[0] >= height):
+            return self._lores
+        if self.jpeg is None or ("decoded", 1) in self._cache:
+            return self.native
+        factor = 1
+        while (factor < 8 and self.width // (factor * 2) >= width
+               and self.height // (factor * 2) >= height):
+            factor *= 2
+        return self._decode(factor)
+
+    def native_at_least(self, width: int) -> np.ndarray:
+        """BGR pixels at least width wide, e.g. for detectors that downsample
+        anyway. May be the native buffer itself."""
+        return self._source(width, 1)
+
+    def _memo(self, key, compute):
+        view = self._cache.get(key)
+        if view is not None:
+            return view
+        with self._lock:
+            view = self._cache.get(key)
+            if view is None:
+                view = compute()
+                self._cache[key] = view
+        return view
+
+    @property
+    def rgb(self) -> np.ndarray:
+        return self._memo("rgb", lambda: cv2.cvtColor(self.native, cv2.COLOR_BGR2RGB))
+
+    @property
+    def lores(self) -> np.ndarray:
+        """BGR pixels of the lores stream."""
+        if self._lores is not None:
+            return self._lores
+        if self.lores_size is None:
+            return self.native
+        return self.resized(*self.lores_size, rgb=False)
+
+    @property
+    def lores_rgb(self) -> np.ndarray:
+        return self._memo("lores_rgb", lambda: cv2.cvtColor(self.lores, cv2.COLOR_BGR2RGB))
+
+    def lores_pil(self) -> Image.Image:
+        """RGB PIL image of the lores stream, for analysis."""
+        return self._memo("lores_pil", lambda: Image.fromarray(self.lores_rgb))
+
+    @property
+    def gray(self) -> np.ndarray:
+        return self._memo("gray", lambda: cv2.cvtColor(self.native, cv2.COLOR_BGR2GRAY))
+
+    def resized(self, width: int, height: int, interpolation=cv2.INTER_AREA, rgb=True) -> np.ndarray:
+        """Frame resized to exactly (width, height), e.g. a model input size."""
+        def compute():
+            small = cv2.resize(self._source(width, height), (width, height), interpolation=interpolation)
+            return cv2.cvtColor(small, cv2.COLOR_BGR2RGB) if rgb else small
+        return self._memo(("resized", width, height, interpolation, rgb), compute)
+
+    def thumbnail(self, width: int, height: int) -> np.ndarray:
+        """RGB frame scaled to fit (width, height), letterboxed with black
+        (same result as ImageOps.pad)."""
+        def compute():
+            scale = min(width / self.width, height / self.height)
+            new_w = max(1, round(self.width * scale))
+            new_h = max(1, round(self.height * scale))
+            small = cv2.resize(self._source(new_w, new_h), (new_w, new_h), interpolation=cv2.INTER_AREA)
+            out = np.zeros((height, width, 3), dtype=np.uint8)
+            x = (width - new_w) // 2
+            y = (height - new_h) // 2
+            out[y:y + new_h, x:x + new_w] = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+            return out
+        return self._memo(("thumbnail", width, height), compute)
+
+    def pil(self) -> Image.Image:
+        """Full-resolution RGB PIL image."""
+        return self._memo("pil", lambda: Image.fromarray(self.rgb))
+
+    def crop_rgb(self, roi: tuple[int, int, int, int]) -> np.ndarray:
+        """RGB view of roi (x1, y1, x2, y2), no copy."""
+        x1, y1, x2, y2 = roi
+        return self.rgb[y1:y2, x1:x2]
@@ -0,0 +1,283 @@
+import threading
+from collections import deque
+from itertools import islice
+import numpy as np
+
+
+class FrameLease:
+    """Zero-copy view over a contiguous run of ring slots.
+
+    The slots stay reserved until release() is called, so the capture path
+    cannot overwrite frames a save worker is still writing.
+    """
+    def __init__(self, ring, start_slot: int, count: int):
+        self._ring = ring
+        self.start_slot = start_slot
+        self.count = count
+        self.frames = ring.frames[start_slot:start_slot + count]
+        self.timestamps = ring.timestamps[start_slot:start_slot + count]
+        self._released = False
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        """Yield (timestamp, frame) pairs, same shape as the old buffer list."""
+        return zip(self.timestamps, self.frames)
+
+    def __getitem__(self, index):
+        return self.timestamps[index], self.frames[index]
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self._ring._release(self.start_slot, self.count)
+
+
+class FrameRingBuffer:
+    """Fixed-capacity frame ring backed by one preallocated uint8 array.
+
+    Frames are written straight into the next slot (see next_slot/commit),
+    so steady-state capture does not allocate. Timestamps live in a parallel
+    float64 array.
+    """
+    def __init__(self, capacity: int, height: int, width: int, channels: int = 3):
+        self.capacity = capacity
+        self.frames = np.empty((capacity, height, width, channels), dtype=np.uint8)
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self._lease_counts = np.zeros(capacity, dtype=np.int32)
+        self._lock = threading.Lock()
+
+        # Total frames committed since creation; slot = write_count % capacity
+        self.write_count = 0
+
+    @property
+    def frame_shape(self) -> tuple[int, int, int]:
+        return self.frames.shape[1:]
+
+    @property
+    def nbytes(self) -> int:
+        return self.frames.nbytes + self.timestamps.nbytes
+
+    def next_slot(self) -> int | None:
+        """Return the slot to write the next frame into, None if it is leased."""
+        slot = self.write_count % self.capacity
+        with self._lock:
+            if self._lease_counts[slot]:
+                return None
+        return slot
+
+    def commit(self, slot: int, timestamp: float):
+        """Mark the frame written into slot as valid."""
+        with self._lock:
+            self.timestamps[slot] = timestamp
+            self.write_count += 1
+
+    def lease(self, start_slot: int, count: int) -> FrameLease:
+        """Reserve count slots starting at start_slot. Must not wrap the ring."""
+        if start_slot < 0 or start_slot + count > self.capacity:
+            raise ValueError(f"lease [{start_slot}, {start_slot + count}) outside ring of {self.capacity}")
+        with self._lock:
+            self._lease_counts[start_slot:start_slot + count] += 1
+        return FrameLease(self, start_slot, count)
+
+    def lease_window(self, after: float, end: float, max_frames: int | None = None) -> list[FrameLease]:
+        """Lease every buffered frame with after < timestamp <= end, or only
+        the oldest max_frames of them.
+
+        Returns up to two leases (the window may wrap the end of the ring),
+        oldest first. The slot the capture path writes next is never included.
+        """
+        leases = []
+        with self._lock:
+            # The oldest slot is the one being overwritten next, skip it
+            count = min(self.write_count, self.capacity - 1)
+            if count <= 0:
+                return leases
+            slots = np.arange(self.write_count - count, self.write_count) % self.capacity
+            ts = self.timestamps[slots]
+            slots = slots[(ts > after) & (ts <= end)]
+            if max_frames is not None:
+                slots = slots[:max_frames]
+            if len(slots) == 0:
+                return leases
+
+            # Split into contiguous runs where the window wraps the ring
+            breaks = np.nonzero(np.diff(slots) != 1)[0] + 1
+            for run in np.split(slots, breaks):
+                start_slot, run_len = int(run[0]), len(run)
+                self._lease_counts[start_slot:start_slot + run_len] += 1
+                leases.append(FrameLease(self, start_slot, run_len))
+        return leases
+
+    def _release(self, start_slot: int, count: int):
+        with self._lock:
+            self._lease_counts[start_slot:start_slot + count] -= 1
+
+
+class _PoolLease:
+    """Returns one PublishPool buffer when released."""
+    def __init__(self, pool, index: int):
+        self._pool = pool
+        self.index = index
+        self._released = False
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self._pool._release(self.index)
+
+
+class PublishPool:
+    """Recycled buffers for frames published to consumers.
+
+    Published frames are copied out of the capture ring, so a consumer that
+    keeps one never holds up the ring's sequential writes. Any free buffer
+    is handed out (no fixed order); when all are still held a fresh array
+    is allocated instead and counted in misses.
+    """
+    def __init__(self, size: int, height: int, width: int, channels: int = 3):
+        self.shape = (height, width, channels)
+        self.buffers = np.empty((size, height, width, channels), dtype=np.uint8)
+        self._free = deque(range(size))
+        self._lock = threading.Lock()
+        self.misses = 0
+
+    def copy(self, frame: np.ndarray) -> tuple[np.ndarray, _PoolLease | None]:
+        """Copy frame into a free buffer. Returns (buffer, lease), lease is
+        None when the copy had to be allocated."""
+        with self._lock:
+            index = self._free.popleft() if self._free and frame.shape == self.shape else None
+            if index is None:
+                self.misses += 1
+        if index is None:
+            return frame.copy(), None
+        buffer = self.buffers[index]
+        np.copyto(buffer, frame)
+        return buffer, _PoolLease(self, index)
+
+    def _release(self, index: int):
+        with self._lock:
+            self._free.append(index)
+
+
+class EncodedFrameRing:
+    """Ring of JPEG-encoded frames bounded by a byte budget.
+
+    Encoders may finish out of order, so frames are added with their capture
+    sequence number and only appended once every earlier frame has arrived.
+    Entries are (timestamp, jpeg bytes); bytes are immutable, so handing a
+    slice of entries to a save worker does not copy frame data.
+
+    If segment_frames is set, add() also returns each run of segment_frames
+    consecutive entries as it completes.
+    """
+    def __init__(self, max_bytes: int, segment_frames: int = 0):
+        self.max_bytes = max_bytes
+        self.segment_frames = segment_frames
+        self._segment: list[tuple[float, bytes]] = []
+        self.total_bytes = 0
+        self.entries: deque[tuple[float, bytes]] = deque()
+        self.append_count = 0
+        self._pending: dict[int, tuple[float, bytes] | None] = {}
+        self._next_seq = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, seq: int, timestamp: float, jpeg: bytes | None) -> list[list[tuple[float, bytes]]]:
+        """Add the frame with sequence seq (None if encoding failed).
+
+        Returns the segments completed by this call, oldest first.
+        """
+        completed = []
+        with self._lock:
+            self._pending[seq] = None if jpeg is None else (timestamp, jpeg)
+            while self._next_seq in self._pending:
+                entry = self._pending.pop(self._next_seq)
+                self._next_seq += 1
+                if entry is None:
+                    continue
+                self.entries.append(entry)
+                self.total_bytes += len(entry[1])
+                self.append_count += 1
+
+                if self.segment_frames:
+                    self._segment.append(entry)
+                    if len(self._segment) >= self.segment_frames:
+                        completed.append(self._segment)
+                        self._segment = []
+
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                _, old = self.entries.popleft()
+                self.total_bytes -= len(old)
+        return completed
+
+    def last(self, count: int) -> list[tuple[float, bytes]]:
+        """Return the newest count entries, oldest first."""
+        with self._lock:
+            newest = list(islice(reversed(self.entries), count))
+        newest.reverse()
+        return newest
+
+    def window(self, after: float, end: float) -> list[tuple[float, bytes]]:
+        """Return entries with after < timestamp <= end, oldest first."""
+        with self._lock:
+            return [e for e in self.entries if after < e[0] <= end]
+
+    def duration(self) -> float:
+        """Seconds of footage currently held."""
+        with self._lock:
+            if len(self.entries) < 2:
+                return 0.0
+            return self.entries[-1][0] - self.entries[0][0]
+
+
+class FrameSegment:
+    """A run of (timestamp, frame) pairs handed to the save path.
+
+    Frames are either raw arrays backed by a ring lease or JPEG bytes. The
+    lease, if any, is released once the segment is written or dropped.
+    """
+    def __init__(self, frames: list, lease: FrameLease | None = None):
+        self.frames = frames
+        self.lease = lease
+
+    @classmethod
+    def from_lease(cls, lease: FrameLease) -> "FrameSegment":
+        return cls(list(lease), lease)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __iter__(self):
+        return iter(self.frames)
+
+    def __getitem__(self, index):
+        return self.frames[index]
+
+    @property
+    def start(self) -> float:
+        return float(self.frames[0][0])
+
+    @property
+    def end(self) -> float:
+        return float(self.frames[-1][0])
+
+    def subsample(self, interval_sec: float) -> "FrameSegment":
+        """Keep roughly one frame per interval_sec, sharing the same lease."""
+        kept = []
+        next_ts = None
+        for ts, frame in self.frames:
+            if next_ts is None or ts >= next_ts:
+                kept.append((ts, frame))
+                next_ts = ts + interval_sec
+        return FrameSegment(kept, self.lease)
+
+    def release(self):
+        if self.lease is not None:
+            self.lease.release()
+            self.lease = None
@@ -0,0 +1,227 @@
+import multiprocessing
+import time
+from multiprocessing import shared_memory, resource_tracker
+from typing import NamedTuple
+import numpy as np
+
+BUS_MAGIC = 0x5EED0B05
+
+# Global header, uint64 fields
+_H_MAGIC, _H_SLOTS, _H_HEIGHT, _H_WIDTH, _H_CHANNELS, _H_LATEST_SEQ = range(6)
+HEADER_FIELDS = 8
+# Per-slot header: seq when the write started, seq when it finished (uint64),
+# then capture timestamps (float64)
+_S_STARTED, _S_DONE = 0, 1
+_S_TIMESTAMP, _S_WALL_TIME = 0, 1
+SLOT_FIELDS = 2
+
+# How often readers without the notification condition check for a new frame
+POLL_INTERVAL_SEC = 0.002
+
+
+class BusFrame(NamedTuple):
+    seq: int
+    timestamp: float       # time.monotonic() at capture, in the publisher
+    wall_time: float       # time.time() at capture
+    image: np.ndarray      # BGR, a view into shared memory unless copied
+
+
+class FrameBusHandle(NamedTuple):
+    """What a child process needs to attach to a bus. Pass it as a
+    multiprocessing.Process argument so the condition is inherited."""
+    name: str
+    new_frame: object | None = None
+
+
+class _BusLayout:
+    """numpy views over the shared memory block."""
+    def __init__(self, buf, slots, height, width, channels):
+        offset = 0
+        self.header = np.ndarray((HEADER_FIELDS,), dtype=np.uint64, buffer=buf, offset=offset)
+        offset += self.header.nbytes
+        self.seqs = np.ndarray((slots, SLOT_FIELDS), dtype=np.uint64, buffer=buf, offset=offset)
+        offset += self.seqs.nbytes
+        self.times = np.ndarray((slots, SLOT_FIELDS), dtype=np.float64, buffer=buf, offset=offset)
+        offset += self.times.nbytes
+        self.frames = np.ndarray((slots, height, width, channels), dtype=np.uint8, buffer=buf, offset=offset)
+        self.nbytes = offset + self.frames.nbytes
+
+    @staticmethod
+    def size(slots, height, width, channels) -> int:
+        header = HEADER_FIELDS * 8
+        slot_headers = slots * SLOT_FIELDS * 8 * 2
+        return header + slot_headers + slots * height * width * channels
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Attach to an existing block without handing it to this process's
+    resource tracker, which would otherwise unlink it when we exit."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # track= is new in 3.13
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class FrameBus:
+    """Publisher side of a shared-memory ring of frames.
+
+    Fixed-size slots each hold one frame plus its seq and timestamps. A slot
+    is written seqlock style: started is set before the pixels are copied
+    and done after, so a reader can tell whether what it read was torn.
+    Other processes attach by name (FrameBusReader) and map frames without
+    pickling or copying. Readers started with handle() also get a
+    multiprocessing.Condition that is notified on every publish.
+    """
+    def __init__(self, slots: int, height: int, width: int, channels: int = 3, name: str | None = None):
+        if slots < 2:
+            raise ValueError("FrameBus needs at least 2 slots")
+        size = _BusLayout.size(slots, height, width, channels)
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by a crashed run
+            stale = _attach(name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.name = self.shm.name
+        self.slots = slots
+        self.frame_shape = (height, width, channels)
+        self._layout = _BusLayout(self.shm.buf, slots, height, width, channels)
+        self._layout.header[:] = 0
+        self._layout.seqs[:] = 0
+        header = self._layout.header
+        header[_H_SLOTS], header[_H_HEIGHT], header[_H_WIDTH], header[_H_CHANNELS] = slots, height, width, channels
+        # Written last so readers never see a half-initialised bus
+        header[_H_MAGIC] = BUS_MAGIC
+        self.new_frame = multiprocessing.get_context().Condition()
+        self.published = 0
+
+    def handle(self) -> FrameBusHandle:
+        return FrameBusHandle(self.name, self.new_frame)
+
+    def publish(self, image: np.ndarray, seq: int, timestamp: float, wall_time: float = 0.0) -> bool:
+        """Copy one frame into its slot (seq % slots). seq must be > 0 and
+        increasing. Returns False if the frame doesn't match the bus shape."""
+        if image.shape != self.frame_shape:
+            return False
+        layout = self._layout
+        slot = seq % self.slots
+        layout.seqs[slot, _S_STARTED] = seq
+        np.copyto(layout.frames[slot], image)
+        layout.times[slot, _S_TIMESTAMP] = timestamp
+        layout.times[slot, _S_WALL_TIME] = wall_time
+        layout.seqs[slot, _S_DONE] = seq
+        layout.header[_H_LATEST_SEQ] = seq
+        self.published += 1
+        # Never hold up capture for a slow reader
+        if self.new_frame.acquire(block=False):
+            try:
+                self.new_frame.notify_all()
+            finally:
+                self.new_frame.release()
+        return True
+
+    def close(self):
+        """Remove the shared memory block and release our mapping."""
+        self._layout = None
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+        try:
+            self.shm.close()
+        except BufferError:
+            # A view handed out in this process is still alive, the mapping
+            # goes away with it
+            pass
+
+
+class FrameBusReader:
+    """Consumer side of a FrameBus, usable from any process.
+
+    read(copy=False) returns a view straight into shared memory. It stays
+    valid until the publisher wraps around to that slot again (slots - 1
+    frame periods); check is_current(seq) after using it if that matters.
+    """
+    def __init__(self, handle: FrameBusHandle | str):
+        if isinstance(handle, str):
+            handle = FrameBusHandle(handle)
+        self.name = handle.name
+        self.new_frame = handle.new_frame
+        self.shm = _attach(handle.name)
+        header = np.ndarray((HEADER_FIELDS,), dtype=np.uint64, buffer=self.shm.buf)
+        magic = int(header[_H_MAGIC])
+        self.slots = int(header[_H_SLOTS])
+        self.frame_shape = (int(header[_H_HEIGHT]), int(header[_H_WIDTH]), int(header[_H_CHANNELS]))
+        del header
+        if magic != BUS_MAGIC:
+            self.shm.close()
+            raise ValueError(f"{handle.name} is not an initialised frame bus")
+        self._layout = _BusLayout(self.shm.buf, self.slots, *self.frame_shape)
+
+    @property
+    def latest_seq(self) -> int:
+        return int(self._layout.header[_H_LATEST_SEQ])
+
+    def is_current(self, seq: int) -> bool:
+        """True while the slot of seq has not been overwritten."""
+        return int(self._layout.seqs[seq % self.slots, _S_STARTED]) == seq
+
+    def read(self, seq: int | None = None, copy: bool = True) -> BusFrame | None:
+        """Frame seq (default: the newest), None if it is gone or was being
+        overwritten while we read it."""
+        if seq is None:
+            seq = self.latest_seq
+        if seq <= 0:
+            return None
+        layout = self._layout
+        slot = seq % self.slots
+        if int(layout.seqs[slot, _S_DONE]) != seq:
+            return None
+        image = layout.frames[slot].copy() if copy else layout.frames[slot]
+        timestamp = float(layout.times[slot, _S_TIMESTAMP])
+        wall_time = float(layout.times[slot, _S_WALL_TIME])
+        if not self.is_current(seq):
+            return None
+        return BusFrame(seq, timestamp, wall_time, image)
+
+    def wait(self, after_seq: int, timeout: float | None = None) -> int:
+        """Block until a frame newer than after_seq is published. Returns the
+        newest seq, which equals after_seq on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            seq = self.latest_seq
+            if seq > after_seq:
+                return seq
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return seq
+            if self.new_frame is not None:
+                with self.new_frame:
+                    # Short cap: a notify can slip in between the check and the wait
+                    self.new_frame.wait(0.05 if remaining is None else min(remaining, 0.05))
+            else:
+                time.sleep(POLL_INTERVAL_SEC)
+
+    def frames(self, copy: bool = False, timeout: float | None = None):
+        """Yield each new frame as it is published (skipping any missed)."""
+        seq = self.latest_seq
+        while True:
+            newest = self.wait(seq, timeout)
+            if newest == seq:
+                return
+            seq = newest
+            frame = self.read(seq, copy=copy)
+            if frame is not None:
+                yield frame
+
+    def close(self):
+        self._layout = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass
@@ -0,0 +1,414 @@
+import math
+import os
+import shutil
+import struct
+import subprocess
+from array import array
+
+# AVI flags
+AVIF_HASINDEX = 0x10
+AVIIF_KEYFRAME = 0x10
+
+# Non-standard top-level chunk holding one float64 capture timestamp per
+# frame. Players skip unknown chunks, our reader uses it to trim clips.
+TIMESTAMP_CHUNK = b"sdts"
+FRAME_CHUNK = b"00dc"
+
+# Rolling index written next to a file while it is being recorded in live
+# mode, one record per frame: payload offset, size, timestamp (NaN if none).
+# Removed once the file is finalized with idx1.
+LIVE_INDEX_SUFFIX = ".live"
+LIVE_RECORD = struct.Struct("<QId")
+
+_AVIH_FMT = "<14I"      # 56 bytes, last 4 are reserved
+_STRH_FMT = "<4s4sIHHIIIIIIIIhhhh"  # 56 bytes
+_STRF_FMT = "<IiiHH4sIiiII"        # 40 bytes, BITMAPINFOHEADER
+
+
+def jpeg_size(data: bytes) -> tuple[int, int] | None:
+    """Return (width, height) from a JPEG's SOF marker without decoding it."""
+    i = 2
+    n = len(data)
+    while i + 9 < n:
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        marker = data[i + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7 or marker == 0xFF:
+            i += 2 if marker != 0xFF else 1
+            continue
+        seg_len = struct.unpack(">H", data[i + 2:i + 4])[0]
+        # SOF0..SOF15, skipping DHT (C4), JPG (C8) and DAC (CC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return width, height
+        i += 2 + seg_len
+    return None
+
+
+class MjpegAviWriter:
+    """Write already-encoded JPEG frames into an MJPEG AVI container.
+
+    No pixel data is touched, frames are appended as '00dc' chunks. Header
+    fields that depend on the content (size, frame count, fps) are patched
+    in close(). If per-frame timestamps are passed they are stored in an
+    extra chunk and used to derive the real frame rate, unless playback_fps
+    is given: then the header rate is playback_fps regardless of the
+    timestamps (time-lapse files are captured at 0.2 fps but played faster).
+
+    With live=True every frame is flushed and recorded in a rolling index
+    (<path>.live), so MjpegAviReader can read all complete frames while
+    the file is still being written.
+    """
+    def __init__(self, path: str, fps: float, width: int = 0, height: int = 0, live: bool = False,
+                 playback_fps: float | None = None):
+        self.path = path
+        self.fps = fps
+        self.playback_fps = playback_fps
+        self.width = width
+        self.height = height
+
+        self.frame_count = 0
+        self.bytes_written = 0
+        self._max_chunk = 0
+        # (offset from 'movi' fourcc, size) for idx1
+        self._index: list[tuple[int, int]] = []
+        self.timestamps = array("d")
+        self._has_timestamps = True
+
+        self._f = open(path, "wb")
+        self._write_header()
+        self._movi_list_pos = self._f.tell()
+        self._f.write(b"LIST\0\0\0\0movi")
+        self._movi_fourcc_pos = self._movi_list_pos + 8
+
+        self.live_index_path = path + LIVE_INDEX_SUFFIX if live else None
+        self._live = open(self.live_index_path, "wb") if live else None
+
+    def _write_header(self):
+        f = self._f
+        f.write(b"RIFF\0\0\0\0AVI ")
+        # hdrl LIST: 4 ('hdrl') + avih chunk (8+56) + strl LIST (8+4+ strh 8+56 + strf 8+40)
+        strl_size = 4 + (8 + 56) + (8 + 40)
+        hdrl_size = 4 + (8 + 56) + (8 + strl_size)
+        f.write(b"LIST" + struct.pack("<I", hdrl_size) + b"hdrl")
+        self._avih_pos = f.tell() + 8
+        f.write(b"avih" + struct.pack("<I", 56) + b"\0" * 56)
+        f.write(b"LIST" + struct.pack("<I", strl_size) + b"strl")
+        self._strh_pos = f.tell() + 8
+        f.write(b"strh" + struct.pack("<I", 56) + b"\0" * 56)
+        self._strf_pos = f.tell() + 8
+        f.write(b"strf" + struct.pack("<I", 40) + b"\0" * 40)
+
+    def write_frame(self, jpeg: bytes, timestamp: float | None = None):
+        """Append one JPEG frame."""
+        if self.frame_count == 0 and not (self.width and self.height):
+            size = jpeg_size(jpeg)
+            if size:
+                self.width, self.height = size
+
+        size = len(jpeg)
+        offset = self._f.tell() - self._movi_fourcc_pos
+        self._f.write(FRAME_CHUNK + struct.pack("<I", size))
+        self._f.write(jpeg)
+        if size & 1:
+            self._f.write(b"\0")
+
+        self._index.append((offset, size))
+        self._max_chunk = max(self._max_chunk, size)
+        self.frame_count += 1
+        self.bytes_written += size
+
+        if timestamp is None:
+            self._has_timestamps = False
+        else:
+            self.timestamps.append(timestamp)
+
+        if self._live is not None:
+            # Frame data must be visible before the record pointing at it
+            self._f.flush()
+            self._live.write(LIVE_RECORD.pack(
+                self._movi_fourcc_pos + offset + 8, size,
+                math.nan if timestamp is None else timestamp
+            ))
+            self._live.flush()
+
+    def frame_offsets(self) -> list[int]:
+        """Absolute file offset of each frame's JPEG payload."""
+        return [self._movi_fourcc_pos + offset + 8 for offset, _ in self._index]
+
+    def effective_fps(self) -> float:
+        """Frame rate written to the header: playback_fps if set, else the
+        rate from the capture timestamps, falling back to fps."""
+        if self.playback_fps:
+            return self.playback_fps
+        if self._has_timestamps and len(self.timestamps) > 1:
+            span = self.timestamps[-1] - self.timestamps[0]
+            if span > 0:
+                return (len(self.timestamps) - 1) / span
+        return self.fps
+
+    def close(self) -> str:
+        if self._f.closed:
+            return self.path
+        f = self._f
+        movi_end = f.tell()
+        f.write(b"idx1" + struct.pack("<I", 16 * len(self._index)))
+        for offset, size in self._index:
+            f.write(FRAME_CHUNK + struct.pack("<III", AVIIF_KEYFRAME, offset, size))
+
+        if self._has_timestamps and self.timestamps:
+            payload = self.timestamps.tobytes()
+            f.write(TIMESTAMP_CHUNK + struct.pack("<I", len(payload)) + payload)
+
+        file_end = f.tell()
+        fps = self.effective_fps()
+        rate, scale = int(round(fps * 1000)), 1000
+
+        f.seek(4)
+        f.write(struct.pack("<I", file_end - 8))
+        f.seek(self._movi_list_pos + 4)
+        f.write(struct.pack("<I", movi_end - self._movi_list_pos - 8))
+
+        f.seek(self._avih_pos)
+        f.write(struct.pack(
+            _AVIH_FMT,
+            int(1e6 / fps) if fps else 0,
+            int(self._max_chunk * fps),
+            0, AVIF_HASINDEX, self.frame_count, 0, 1,
+            self._max_chunk, self.width, self.height, 0, 0, 0, 0
+        ))
+        f.seek(self._strh_pos)
+        f.write(struct.pack(
+            _STRH_FMT,
+            b"vids", b"MJPG", 0, 0, 0, 0, scale, rate, 0,
+            self.frame_count, self._max_chunk, 0xFFFFFFFF, 0,
+            0, 0, self.width, self.height
+        ))
+        f.seek(self._strf_pos)
+        f.write(struct.pack(
+            _STRF_FMT,
+            40, self.width, self.height, 1, 24, b"MJPG",
+            self.width * self.height * 3, 0, 0, 0, 0
+        ))
+        f.close()
+        self._remove_live_index()
+        return self.path
+
+    def _remove_live_index(self):
+        if self._live is None:
+            return
+        self._live.close()
+        try:
+            os.remove(self.live_index_path)
+        except OSError:
+            pass
+
+    def abort(self):
+        """Close and delete a partially written file."""
+        if not self._f.closed:
+            self._f.close()
+        self._remove_live_index()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class MjpegAviReader:
+    """Index an MJPEG AVI and read its JPEG frames as bytes (no decode).
+
+    Uses idx1 when present and otherwise walks the movi chunks, so files
+    written by OpenCV or by MjpegAviWriter both work. A file still being
+    written in live mode is read through its rolling index, which also
+    carries the timestamps; only complete frames are returned.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.fps = 0.0
+        self.width = 0
+        self.height = 0
+        # Absolute file offset and size of each frame's payload
+        self.offsets: list[int] = []
+        self.sizes: list[int] = []
+        self.timestamps: array | None = None
+        self._f = open(path, "rb")
+        self._parse()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def _parse(self):
+        f = self._f
+        f.seek(0, os.SEEK_END)
+        file_size = f.tell()
+        f.seek(0)
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"AVI ":
+            raise ValueError(f"Not an AVI file: {self.path}")
+
+        movi_start = movi_end = None
+        idx1 = None
+        pos = 12
+        while pos + 8 <= file_size:
+            f.seek(pos)
+            ckid, size = struct.unpack("<4sI", f.read(8))
+            if ckid == b"LIST":
+                list_type = f.read(4)
+                if list_type == b"hdrl":
+                    self._parse_hdrl(pos + 12, pos + 8 + size)
+                elif list_type == b"movi":
+                    movi_start = pos + 8
+                    if size == 0:
+                        # Not finalized yet, the movi data runs to the end of the file
+                        movi_end = file_size
+                        break
+                    movi_end = min(pos + 8 + size, file_size)
+            elif ckid == b"idx1":
+                idx1 = (pos + 8, size)
+            elif ckid == TIMESTAMP_CHUNK:
+                self.timestamps = array("d")
+                self.timestamps.frombytes(f.read(size - size % 8))
+            pos += 8 + size + (size & 1)
+
+        if movi_start is None:
+            raise ValueError(f"No movi list in {self.path}")
+
+        if idx1 is not None:
+            self._read_idx1(idx1[0], idx1[1], movi_start, file_size)
+        elif os.path.exists(self.path + LIVE_INDEX_SUFFIX):
+            self._read_live_index(file_size)
+        if not self.offsets:
+            self._walk_movi(movi_start + 4, movi_end, file_size)
+
+        if self.timestamps is not None and len(self.timestamps) != len(self.offsets):
+            self.timestamps = None
+
+    def _parse_hdrl(self, start, end):
+        f = self._f
+        pos = start
+        while pos + 8 <= end:
+            f.seek(pos)
+            ckid, size = struct.unpack("<4sI", f.read(8))
+            if ckid == b"LIST":
+                self._parse_hdrl(pos + 12, pos + 8 + size)
+            elif ckid == b"avih" and size >= 56:
+                fields = struct.unpack(_AVIH_FMT, f.read(56))
+                if fields[0]:
+                    self.fps = 1e6 / fields[0]
+                self.width, self.height = fields[8], fields[9]
+            elif ckid == b"strh" and size >= 56:
+                fields = struct.unpack(_STRH_FMT, f.read(56))
+                scale, rate = fields[6], fields[7]
+                if fields[0] == b"vids" and scale:
+                    self.fps = rate / scale
+            pos += 8 + size + (size & 1)
+
+    def _read_idx1(self, start, size, movi_start, file_size):
+        f = self._f
+        f.seek(start)
+        data = f.read(size)
+        entries = [struct.unpack_from("<4sIII", data, i) for i in range(0, len(data) - 15, 16)]
+        entries = [e for e in entries if e[0][2:] == b"dc"]
+        if not entries:
+            return
+        # idx1 offsets are usually relative to the 'movi' fourcc, some writers
+        # use absolute file offsets instead.
+        base = movi_start
+        if entries[0][2] >= movi_start:
+            base = 0
+        for _, _, offset, length in entries:
+            payload = base + offset + 8
+            if payload + length > file_size:
+                break
+            self.offsets.append(payload)
+            self.sizes.append(length)
+
+    def _read_live_index(self, file_size):
+        try:
+            with open(self.path + LIVE_INDEX_SUFFIX, "rb") as live:
+                data = live.read()
+        except FileNotFoundError:
+            # Finalized between our checks, idx1 wasn't there when we looked
+            return
+        data = data[:len(data) - len(data) % LIVE_RECORD.size]
+        timestamps = array("d")
+        for offset, size, timestamp in LIVE_RECORD.iter_unpack(data):
+            if offset + size > file_size:
+                break
+            self.offsets.append(offset)
+            self.sizes.append(size)
+            timestamps.append(timestamp)
+        if timestamps and not any(math.isnan(t) for t in timestamps):
+            self.timestamps = timestamps
+
+    def _walk_movi(self, pos, end, file_size):
+        f = self._f
+        while pos + 8 <= end:
+            f.seek(pos)
+            ckid, size = struct.unpack("<4sI", f.read(8))
+            if ckid == b"LIST":
+                # 'rec ' lists group chunks, descend into them
+                pos += 12
+                continue
+            if pos + 8 + size > file_size:
+                break   # partially written chunk
+            if ckid[2:] == b"dc":
+                self.offsets.append(pos + 8)
+                self.sizes.append(size)
+            pos += 8 + size + (size & 1)
+
+    def read_frame(self, index: int) -> bytes:
+        self._f.seek(self.offsets[index])
+        return self._f.read(self.sizes[index])
+
+    def frame_timestamps(self, start_time: float | None = None) -> list[float]:
+        """Per-frame timestamps, interpolated from fps when none were stored."""
+        if self.timestamps is not None:
+            return list(self.timestamps)
+        fps = self.fps or 1.0
+        start = start_time or 0.0
+        return [start + i / fps for i in range(len(self.offsets))]
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def find_ffmpeg() -> str | None:
+    """Path to an ffmpeg binary, preferring the one bundled with imageio-ffmpeg."""
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return shutil.which("ffmpeg")
+
+
+def remux_stream_copy(src: str, dst: str) -> bool:
+    """Copy the streams of src into the container implied by dst's extension
+    without re-encoding. Returns False if no muxer is available or it fails."""
+    ffmpeg = find_ffmpeg()
+    if ffmpeg is None:
+        return False
+    result = subprocess.run(
+        [ffmpeg, "-y", "-loglevel", "error", "-i", src, "-c", "copy", dst],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    if result.returncode != 0:
+        print("Stream-copy remux failed:", result.stderr.decode(errors="replace").strip())
+        return False
+    return True
@@ -0,0 +1,80 @@
+import threading
+from bisect import bisect_left
+import cv2
+import numpy as np
+
+# Segment decisions
+DECISION_SAVE = 'save'
+DECISION_IDLE = 'idle'
+DECISION_WAIT = 'wait'
+
+
+class MotionGate:
+    """Cheap activity detector on a downsampled grayscale copy of each frame.
+
+    Keeps a running-average background model and flags motion when enough
+    pixels differ from it. Segments are judged against the motion history
+    with pre/post padding: a segment is saved if there was motion within
+    post_seconds before it or pre_seconds after it.
+    """
+    def __init__(self, pre_seconds=2.0, post_seconds=4.0, width=160,
+                 pixel_threshold=25, min_changed_fraction=0.005,
+                 learning_rate=0.05, history_seconds=300):
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_fraction = min_changed_fraction
+        self.learning_rate = learning_rate
+        self.history_seconds = history_seconds
+
+        self.motion_score = 0.0
+        self.last_motion_ts = 0.0
+        self._background: np.ndarray | None = None
+        self._small_size: tuple[int, int] | None = None
+        self._gray = None
+        self._diff = None
+        self._motion_ts: list[float] = []
+        self._lock = threading.Lock()
+
+    def update(self, frame: np.ndarray, timestamp: float) -> bool:
+        """Feed one BGR frame. Returns True if it shows motion."""
+        if self._small_size is None:
+            h, w = frame.shape[:2]
+            self._small_size = (self.width, max(1, round(h * self.width / w)))
+
+        small = cv2.resize(frame, self._small_size, interpolation=cv2.INTER_AREA)
+        self._gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+
+        if self._background is None:
+            self._background = self._gray.astype(np.float32)
+            return False
+
+        self._diff = cv2.absdiff(self._gray, cv2.convertScaleAbs(self._background), dst=self._diff)
+        changed = np.count_nonzero(self._diff > self.pixel_threshold) / self._diff.size
+        cv2.accumulateWeighted(self._gray, self._background, self.learning_rate)
+
+        self.motion_score = changed
+        motion = changed >= self.min_changed_fraction
+        if motion:
+            with self._lock:
+                self.last_motion_ts = timestamp
+                self._motion_ts.append(timestamp)
+                if len(self._motion_ts) > 1024:
+                    cutoff = bisect_left(self._motion_ts, timestamp - self.history_seconds)
+                    del self._motion_ts[:cutoff]
+        return motion
+
+    def had_motion(self, start: float, end: float) -> bool:
+        with self._lock:
+            index = bisect_left(self._motion_ts, start)
+            return index < len(self._motion_ts) and self._motion_ts[index] <= end
+
+    def decide(self, start: float, end: float, now: float) -> str:
+        """Whether the segment [start, end] should be saved, is idle, or
+        must wait until its pre-padding window has been observed."""
+        if self.had_motion(start - self.post_seconds, end + self.pre_seconds):
+            return DECISION_SAVE
+        if now >= end + self.pre_seconds:
+            return DECISION_IDLE
+        return DECISION_WAIT
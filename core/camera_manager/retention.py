@@ -0,0 +1,146 @@
+import os
+import threading
+import time
+from typing import Optional
+from pydantic import BaseModel
+
+from core.camera_manager.segment_catalog import SegmentCatalog, SegmentRecord, KIND_SEGMENT, KIND_EVENT
+from core.camera_manager.thumbnail_index import ThumbnailIndex
+from core.camera_manager.timelapse import TimelapseArchive
+
+# Pruning rewrites the thumbnail files, so let an hour of expired
+# thumbnails accumulate before doing it
+THUMBNAIL_PRUNE_SLACK_SEC = 3600
+
+
+class RetentionPolicy(BaseModel):
+    # Total bytes allowed for everything in the catalog, None = unlimited
+    max_total_bytes: Optional[int] = None
+    # Routine segments are deleted once older than this
+    segment_max_age_sec: Optional[float] = 60
+    # Event clips are kept much longer than routine segments
+    event_max_age_sec: Optional[float] = 3 * 24 * 3600
+    # The thumbnail filmstrip covers the same span as event clips by default
+    thumbnail_max_age_sec: Optional[float] = 3 * 24 * 3600
+    # The time-lapse archive has its own budget, separate from max_total_bytes
+    timelapse_max_bytes: Optional[int] = 512 * 1024 * 1024
+    timelapse_max_age_sec: Optional[float] = 7 * 24 * 3600
+
+
+class RetentionManager:
+    """Long-lived background worker enforcing a RetentionPolicy on a catalog.
+
+    Each pass deletes by age first, then evicts oldest-first until the byte
+    budget is met. Routine segments are always evicted before event clips,
+    so event clips only go when segments alone cannot satisfy the budget.
+    """
+    def __init__(self, catalog: SegmentCatalog, policy: RetentionPolicy, interval_sec: float = 30,
+                 thumbnails: ThumbnailIndex | None = None, timelapse: TimelapseArchive | None = None):
+        self.catalog = catalog
+        self.policy = policy
+        self.thumbnails = thumbnails
+        self.timelapse = timelapse
+        self.interval_sec = interval_sec
+
+        self.files_removed = 0
+        self.bytes_reclaimed = 0
+        self.last_run = 0.0
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def wake(self):
+        """Run a pass now instead of waiting for the interval."""
+        self._wake.set()
+
+    def _worker(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as err:
+                print("Retention pass failed:", err)
+            self._wake.wait(self.interval_sec)
+            self._wake.clear()
+
+    def run_once(self, now: float | None = None) -> int:
+        """Apply the policy once. Returns the bytes reclaimed by this pass."""
+        now = now or time.time()
+        policy = self.policy
+        doomed: dict[str, SegmentRecord] = {}
+
+        if policy.segment_max_age_sec is not None:
+            for record in self.catalog.ended_before(now - policy.segment_max_age_sec, KIND_SEGMENT):
+                doomed[record.filename] = record
+        if policy.event_max_age_sec is not None:
+            for record in self.catalog.ended_before(now - policy.event_max_age_sec, KIND_EVENT):
+                doomed[record.filename] = record
+
+        if policy.max_total_bytes is not None:
+            remaining = self.catalog.total_bytes() - sum(r.size_bytes for r in doomed.values())
+            for kind in (KIND_SEGMENT, KIND_EVENT):
+                if remaining <= policy.max_total_bytes:
+                    break
+                for record in self.catalog.records(kind):
+                    if remaining <= policy.max_total_bytes:
+                        break
+                    if record.filename in doomed:
+                        continue
+                    doomed[record.filename] = record
+                    remaining -= record.size_bytes
+
+        reclaimed = 0
+        removed = 0
+        for record in sorted(doomed.values(), key=lambda r: r.start):
+            filepath = self.catalog.full_path(record)
+            try:
+                os.remove(filepath)
+            except FileNotFoundError:
+                pass
+            except OSError as err:
+                print("Failed to remove:", filepath, "Error:", err)
+                continue
+            self.catalog.remove(record.filename)
+            reclaimed += record.size_bytes
+            removed += 1
+
+        self.files_removed += removed
+        self.bytes_reclaimed += reclaimed
+        self.last_run = now
+        self._prune_thumbnails(now)
+        self._prune_timelapse(now)
+        if removed:
+            print(f"Retention: {removed} files removed "
+                  f"({reclaimed / (1024*1024):.2f} MB reclaimed, "
+                  f"{self.bytes_reclaimed / (1024*1024):.2f} MB total)")
+        return reclaimed
+
+    def _prune_thumbnails(self, now: float):
+        if self.thumbnails is None or self.policy.thumbnail_max_age_sec is None:
+            return
+        cutoff = now - self.policy.thumbnail_max_age_sec
+        oldest = self.thumbnails.oldest_timestamp()
+        if oldest is not None and oldest < cutoff - THUMBNAIL_PRUNE_SLACK_SEC:
+            pruned = self.thumbnails.prune_before(cutoff)
+            print(f"Retention: {pruned} thumbnails removed")
+
+    def _prune_timelapse(self, now: float):
+        if self.timelapse is None:
+            return
+        removed, reclaimed = self.timelapse.prune(
+            self.policy.timelapse_max_age_sec, self.policy.timelapse_max_bytes, now
+        )
+        if removed:
+            print(f"Retention: {removed} time-lapse files removed "
+                  f"({reclaimed / (1024*1024):.2f} MB reclaimed)")
@@ -0,0 +1,72 @@
+import threading
+
+
+class SaveStats:
+    """Thread-safe counters for the segment save path."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queued_segments = 0
+        self.written_segments = 0
+        self.written_frames = 0
+        self.dropped_segments = 0
+        self.dropped_frames = 0
+        self.reduced_quality_segments = 0
+        self.failed_segments = 0
+        # Frames not buffered because the next ring slot was still leased by
+        # a pending save (saving fell behind)
+        self.ring_full_frames = 0
+        # Segments the motion gate judged idle (dropped or reduced to keyframes)
+        self.idle_segments = 0
+        self.last_encode_ms_per_frame = 0.0
+        self.max_encode_ms_per_frame = 0.0
+        self._encode_ms_total = 0.0
+
+    def record_queued(self):
+        with self._lock:
+            self.queued_segments += 1
+
+    def record_dropped(self, frame_count: int):
+        with self._lock:
+            self.dropped_segments += 1
+            self.dropped_frames += frame_count
+
+    def record_idle(self):
+        with self._lock:
+            self.idle_segments += 1
+
+    def record_ring_full(self):
+        with self._lock:
+            self.ring_full_frames += 1
+
+    def record_failed(self):
+        with self._lock:
+            self.failed_segments += 1
+
+    def record_written(self, frame_count: int, elapsed_sec: float, reduced_quality: bool):
+        ms_per_frame = 1000 * elapsed_sec / max(frame_count, 1)
+        with self._lock:
+            self.written_segments += 1
+            self.written_frames += frame_count
+            if reduced_quality:
+                self.reduced_quality_segments += 1
+            self.last_encode_ms_per_frame = ms_per_frame
+            self.max_encode_ms_per_frame = max(self.max_encode_ms_per_frame, ms_per_frame)
+            self._encode_ms_total += ms_per_frame
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            avg = self._encode_ms_total / self.written_segments if self.written_segments else 0.0
+            return {
+                "queued_segments": self.queued_segments,
+                "written_segments": self.written_segments,
+                "written_frames": self.written_frames,
+                "dropped_segments": self.dropped_segments,
+                "dropped_frames": self.dropped_frames,
+                "reduced_quality_segments": self.reduced_quality_segments,
+                "failed_segments": self.failed_segments,
+                "ring_full_frames": self.ring_full_frames,
+                "idle_segments": self.idle_segments,
+                "last_encode_ms_per_frame": self.last_encode_ms_per_frame,
+                "avg_encode_ms_per_frame": avg,
+                "max_encode_ms_per_frame": self.max_encode_ms_per_frame,
+            }
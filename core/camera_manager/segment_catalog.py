@@ -0,0 +1,184 @@
+import json
+import os
+import threading
+from bisect import bisect_left
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+CATALOG_FILENAME = "segments.jsonl"
+
+# Record kinds
+KIND_SEGMENT = "segment"   # continuous recording segment
+KIND_EVENT = "event"       # clip cut for a triggered SeeDo
+
+
+class SegmentRecord(BaseModel):
+    filename: str             # relative to the catalog's data dir
+    start: float
+    end: float
+    frame_count: int
+    size_bytes: int
+    kind: str = KIND_SEGMENT
+    # Absolute file offset of each frame's JPEG payload
+    frame_offsets: List[int] = Field(default_factory=list)
+
+
+def _sort_key(record: SegmentRecord):
+    return record.start, record.filename
+
+
+class SegmentCatalog:
+    """Append-only catalog of recorded video files.
+
+    Each finalized file is appended to segments.jsonl as one JSON line and
+    deletions are appended as tombstones, so the directory never needs to be
+    listed. In memory the records are kept sorted by start time, which makes
+    time-range lookups a bisect instead of a scan.
+    """
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+        self.path = os.path.join(data_dir, CATALOG_FILENAME)
+        self._lock = threading.Lock()
+        self._records: list[SegmentRecord] = []
+        self._starts: list[float] = []
+        self._by_name: dict[str, SegmentRecord] = {}
+        # Longest record seen per kind, bounds how far back an overlap can
+        # start. Per kind so a days-long export doesn't widen segment lookups.
+        self._max_duration: dict[str, float] = {}
+        self._tombstones = 0
+
+        os.makedirs(data_dir, exist_ok=True)
+        if os.path.exists(self.path):
+            self._load()
+            if self._tombstones > len(self._records):
+                self.compact()
+        else:
+            self._import_legacy_files()
+
+    def __len__(self):
+        return len(self._records)
+
+    def full_path(self, record: SegmentRecord) -> str:
+        return os.path.join(self.data_dir, record.filename)
+
+    # -------- persistence --------
+    def _load(self):
+        with open(self.path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    raw = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn last line after a crash
+                    continue
+                if raw.get("deleted"):
+                    self._tombstones += 1
+                    self._remove_from_index(raw["deleted"])
+                else:
+                    self._insert(SegmentRecord(**raw))
+
+    def _append_line(self, data: dict):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(data) + "\n")
+            f.flush()
+
+    def compact(self):
+        """Rewrite the catalog file without tombstones."""
+        with self._lock:
+            self._compact_locked()
+
+    def _compact_locked(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            for record in self._records:
+                f.write(record.model_dump_json() + "\n")
+        os.replace(tmp_path, self.path)
+        self._tombstones = 0
+
+    def _import_legacy_files(self):
+        """One-time import of camera_<s>_<e>.avi files written before the catalog existed."""
+        for name in sorted(os.listdir(self.data_dir)):
+            if not (name.startswith("camera_") and name.endswith(".avi")):
+                continue
+            try:
+                _, s, e = name[:-4].split("_")
+                start, end = float(s), float(e)
+            except ValueError:
+                continue
+            size = os.path.getsize(os.path.join(self.data_dir, name))
+            self.add(SegmentRecord(filename=name, start=start, end=end, frame_count=0, size_bytes=size))
+
+    # -------- index --------
+    def _insert(self, record: SegmentRecord):
+        if record.filename in self._by_name:
+            self._remove_from_index(record.filename)
+        index = bisect_left(self._records, _sort_key(record), key=_sort_key)
+        self._records.insert(index, record)
+        self._starts.insert(index, record.start)
+        self._by_name[record.filename] = record
+        self._max_duration[record.kind] = max(self._max_duration.get(record.kind, 0.0),
+                                              record.end - record.start)
+
+    def _remove_from_index(self, filename: str) -> Optional[SegmentRecord]:
+        record = self._by_name.pop(filename, None)
+        if record is None:
+            return None
+        index = bisect_left(self._records, _sort_key(record), key=_sort_key)
+        if index < len(self._records) and self._records[index] is record:
+            del self._records[index]
+            del self._starts[index]
+        return record
+
+    # -------- public API --------
+    def add(self, record: SegmentRecord):
+        with self._lock:
+            self._append_line(record.model_dump())
+            self._insert(record)
+
+    def remove(self, filename: str) -> Optional[SegmentRecord]:
+        with self._lock:
+            record = self._remove_from_index(filename)
+            if record is not None:
+                self._append_line({"deleted": filename})
+                self._tombstones += 1
+                # Retention deletes constantly, keep the file from growing
+                # beyond twice the live records
+                if self._tombstones > len(self._records):
+                    self._compact_locked()
+            return record
+
+    def overlapping(self, start: float, end: float, kind: str = KIND_SEGMENT) -> List[SegmentRecord]:
+        """Records of the given kind overlapping [start, end], oldest first."""
+        with self._lock:
+            if kind is None:
+                max_duration = max(self._max_duration.values(), default=0.0)
+            else:
+                max_duration = self._max_duration.get(kind, 0.0)
+            index = bisect_left(self._starts, start - max_duration)
+            matched = []
+            while index < len(self._records) and self._records[index].start <= end:
+                record = self._records[index]
+                if record.end >= start and (kind is None or record.kind == kind):
+                    matched.append(record)
+                index += 1
+            return matched
+
+    def records(self, kind: Optional[str] = None) -> List[SegmentRecord]:
+        """Snapshot of all records (optionally of one kind), oldest first."""
+        with self._lock:
+            return [r for r in self._records if kind is None or r.kind == kind]
+
+    def ended_before(self, cutoff: float, kind: Optional[str] = KIND_SEGMENT) -> List[SegmentRecord]:
+        """Records that ended before cutoff, oldest first."""
+        with self._lock:
+            index = bisect_left(self._starts, cutoff)
+            return [
+                r for r in self._records[:index]
+                if r.end < cutoff and (kind is None or r.kind == kind)
+            ]
+
+    def total_bytes(self, kind: Optional[str] = None) -> int:
+        with self._lock:
+            return sum(r.size_bytes for r in self._records if kind is None or r.kind == kind)
@@ -0,0 +1,212 @@
+import os
+import struct
+import threading
+from bisect import bisect_left, bisect_right, insort
+from typing import List, NamedTuple
+import cv2
+import numpy as np
+
+from core.camera_manager.frame import Frame
+
+THUMBS_BLOB = "thumbs.bin"
+THUMBS_INDEX = "thumbs.idx"
+# One index record: timestamp, offset into the blob, JPEG length
+INDEX_RECORD = struct.Struct("<dQI")
+
+
+class ThumbEntry(NamedTuple):
+    timestamp: float
+    offset: int
+    length: int
+
+
+class ThumbnailIndex:
+    """Compact filmstrip of recorded footage.
+
+    Small JPEGs go into one append-only blob, and a fixed-size index
+    record per thumbnail (timestamp, offset, length) goes into a second
+    file. Reading hours of filmstrip is then a bisect plus a few KB of reads.
+
+    offer() is fed every recorded frame. A thumbnail is kept when the scene
+    changed noticeably since the last one, and at least every interval_sec.
+    """
+    def __init__(self, directory: str, width=160, height=90, quality=70,
+                 interval_sec=10.0, change_threshold=12.0, check_interval_sec=0.5):
+        self.directory = directory
+        self.width = width
+        self.height = height
+        self.quality = quality
+        self.interval_sec = interval_sec
+        # Mean absolute difference (0-255) of the tiny grayscale that counts as a change
+        self.change_threshold = change_threshold
+        self.check_interval_sec = check_interval_sec
+
+        self.blob_path = os.path.join(directory, THUMBS_BLOB)
+        self.index_path = os.path.join(directory, THUMBS_INDEX)
+        self._lock = threading.Lock()
+        # One prune at a time, held while copying outside _lock
+        self._prune_lock = threading.Lock()
+        self._entries: list[ThumbEntry] = []
+        self._blob_size = 0
+
+        self._last_thumb_ts = 0.0
+        self._last_check_ts = 0.0
+        self._last_tiny: np.ndarray | None = None
+
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def oldest_timestamp(self) -> float | None:
+        with self._lock:
+            return self._entries[0].timestamp if self._entries else None
+
+    # -------- persistence --------
+    def _load(self):
+        self._blob_size = os.path.getsize(self.blob_path) if os.path.exists(self.blob_path) else 0
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, "rb") as f:
+            data = f.read()
+        # A torn record after a crash is dropped, and so is every record
+        # from the first one pointing past the end of the blob
+        usable = len(data) - len(data) % INDEX_RECORD.size
+        valid_bytes = 0
+        blob_end = 0
+        for fields in INDEX_RECORD.iter_unpack(data[:usable]):
+            entry = ThumbEntry(*fields)
+            if entry.offset + entry.length > self._blob_size:
+                break
+            insort(self._entries, entry)
+            valid_bytes += INDEX_RECORD.size
+            blob_end = max(blob_end, entry.offset + entry.length)
+
+        # Cut the files back so the next appends line up with the index
+        if valid_bytes < len(data):
+            with open(self.index_path, "r+b") as f:
+                f.truncate(valid_bytes)
+        if blob_end < self._blob_size:
+            with open(self.blob_path, "r+b") as f:
+                f.truncate(blob_end)
+            self._blob_size = blob_end
+
+    def add(self, timestamp: float, jpeg: bytes):
+        """Append one thumbnail JPEG."""
+        with self._lock:
+            with open(self.blob_path, "ab") as blob:
+                offset = blob.tell()
+                blob.write(jpeg)
+            # Index record last, it only ever points at complete data
+            with open(self.index_path, "ab") as index:
+                index.write(INDEX_RECORD.pack(timestamp, offset, len(jpeg)))
+            self._blob_size = offset + len(jpeg)
+            insort(self._entries, ThumbEntry(timestamp, offset, len(jpeg)))
+
+    def prune_before(self, cutoff: float) -> int:
+        """Drop thumbnails older than cutoff by rewriting both files.
+        Returns the number removed.
+
+        The retained thumbnails are copied without holding the lock, so
+        add() on the capture thread keeps running. The blob is append-only,
+        so bytes already written do not change during the copy. Only the
+        thumbnails added meanwhile are copied under the lock, before the
+        files are swapped."""
+        with self._prune_lock:
+            with self._lock:
+                drop = bisect_left(self._entries, (cutoff,))
+                if drop == 0:
+                    return 0
+                keep = self._entries[drop:]
+                copied_end = self._blob_size
+
+            tmp_blob, tmp_index = self.blob_path + ".tmp", self.index_path + ".tmp"
+            moved = {}
+
+            def copy(entries, src, blob):
+                for entry in entries:
+                    src.seek(entry.offset)
+                    data = src.read(entry.length)
+                    moved[entry] = ThumbEntry(entry.timestamp, blob.tell(), len(data))
+                    blob.write(data)
+
+            with open(self.blob_path, "rb") as src, open(tmp_blob, "wb") as blob:
+                copy(keep, src, blob)
+
+            with self._lock:
+                added = [e for e in self._entries if e.offset >= copied_end]
+                with open(self.blob_path, "rb") as src, open(tmp_blob, "ab") as blob:
+                    copy(added, src, blob)
+                new_entries = sorted(moved.values())
+                with open(tmp_index, "wb") as index:
+                    for entry in new_entries:
+                        index.write(INDEX_RECORD.pack(*entry))
+                os.replace(tmp_blob, self.blob_path)
+                os.replace(tmp_index, self.index_path)
+                self._entries = new_entries
+                self._blob_size = os.path.getsize(self.blob_path)
+            return drop
+
+    # -------- recording --------
+    def offer(self, frame: Frame, timestamp: float) -> bool:
+        """Consider one recorded frame. Returns True if a thumbnail was stored."""
+        if timestamp - self._last_check_ts < self.check_interval_sec:
+            return False
+        self._last_check_ts = timestamp
+
+        # Tiny grayscale for change detection, from the cheapest source buffer
+        tiny = cv2.cvtColor(frame.resized(32, 18, rgb=False), cv2.COLOR_BGR2GRAY)
+        due = timestamp - self._last_thumb_ts >= self.interval_sec
+        changed = (self._last_tiny is not None
+                   and cv2.absdiff(tiny, self._last_tiny).mean() >= self.change_threshold)
+        if not (due or changed):
+            return False
+
+        thumb = cv2.cvtColor(frame.thumbnail(self.width, self.height), cv2.COLOR_RGB2BGR)
+        ok, encoded = cv2.imencode(".jpg", thumb, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            return False
+        self.add(timestamp, encoded.tobytes())
+        self._last_thumb_ts = timestamp
+        self._last_tiny = tiny
+        return True
+
+    # -------- reading --------
+    def entries(self, start: float, end: float) -> List[ThumbEntry]:
+        """Index entries with start <= timestamp <= end, oldest first."""
+        with self._lock:
+            lo = bisect_left(self._entries, (start,))
+            hi = bisect_right(self._entries, (end, float("inf")))
+            return self._entries[lo:hi]
+
+    def read(self, entry: ThumbEntry) -> bytes:
+        """JPEG of entry, b"" if it was pruned since it was looked up."""
+        # Under the lock: prune_before() swaps the blob and moves offsets
+        with self._lock:
+            i = bisect_left(self._entries, entry)
+            if i == len(self._entries) or self._entries[i] != entry:
+                return b""
+            with open(self.blob_path, "rb") as blob:
+                blob.seek(entry.offset)
+                return blob.read(entry.length)
+
+    def filmstrip(self, start: float, end: float, max_count: int | None = None) -> List[tuple[float, bytes]]:
+        """(timestamp, jpeg) thumbnails in [start, end], evenly thinned to
+        max_count if given."""
+        # Lookup and reads under one lock hold, so offsets match the blob
+        with self._lock:
+            lo = bisect_left(self._entries, (start,))
+            hi = bisect_right(self._entries, (end, float("inf")))
+            entries = self._entries[lo:hi]
+            if max_count and len(entries) > max_count:
+                step = len(entries) / max_count
+                entries = [entries[int(i * step)] for i in range(max_count)]
+            if not entries:
+                return []
+            with open(self.blob_path, "rb") as blob:
+                strip = []
+                for entry in entries:
+                    blob.seek(entry.offset)
+                    strip.append((entry.timestamp, blob.read(entry.length)))
+        return strip
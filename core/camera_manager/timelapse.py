@@ -0,0 +1,217 @@
+import datetime
+import os
+import threading
+import time
+from typing import List
+import cv2
+
+from core.camera_manager.frame import Frame
+from core.camera_manager.mjpeg_avi import MjpegAviWriter, MjpegAviReader, LIVE_INDEX_SUFFIX
+
+TIMELAPSE_PREFIX = "timelapse_"
+TIMELAPSE_NAME_FORMAT = "%Y%m%d_%H%M%S"
+
+
+class TimelapseArchive:
+    """Multi-day, low-rate history next to the full-rate recordings.
+
+    offer() is fed every captured frame and keeps one every interval_sec,
+    downscaled and JPEG-encoded, in one MJPEG AVI per day
+    (timelapse_<YYYYMMDD>_<HHMMSS>.avi, local time, a new part per run).
+    Each frame's timestamp is stored in the file (live index while the day
+    is open, sdts chunk once finalized), so any time range can be looked
+    up. The header rate is fps (playback_fps), not the capture rate, so
+    files play back sped up. prune() enforces the archive's own budget
+    by deleting whole files, oldest first.
+
+    At the defaults (384x216, quality 50, one frame per 5 s) a day is
+    roughly 150-200 MB.
+    """
+    def __init__(self, directory: str, interval_sec=5.0, width=384, height=216, quality=50, fps=10):
+        self.directory = directory
+        self.interval_sec = interval_sec
+        self.width = width
+        self.height = height
+        self.quality = quality
+        self.fps = fps
+
+        self._lock = threading.Lock()
+        self._writer: MjpegAviWriter | None = None
+        self._day = None
+        self._last_ts = 0.0
+        self.frames_written = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+
+    # -------- files --------
+    @staticmethod
+    def _start_from_name(path) -> float | None:
+        name = os.path.basename(path)
+        try:
+            stamp = name[len(TIMELAPSE_PREFIX):-len(".avi")]
+            return time.mktime(time.strptime(stamp, TIMELAPSE_NAME_FORMAT))
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _day_end(start: float) -> float:
+        """Local midnight after start."""
+        next_day = datetime.date.fromtimestamp(start) + datetime.timedelta(days=1)
+        return time.mktime(next_day.timetuple())
+
+    def files(self) -> List[tuple[float, float, str]]:
+        """(start, end bound, path) of every archive file, oldest first.
+        The open file's end bound is now."""
+        starts = []
+        for name in os.listdir(self.directory):
+            if name.startswith(TIMELAPSE_PREFIX) and name.endswith(".avi"):
+                path = os.path.join(self.directory, name)
+                start = self._start_from_name(path)
+                if start is not None:
+                    starts.append((start, path))
+        starts.sort()
+
+        current = self._writer.path if self._writer is not None else None
+        files = []
+        for i, (start, path) in enumerate(starts):
+            end = time.time() if path == current else self._day_end(start)
+            if i + 1 < len(starts):
+                end = min(end, starts[i + 1][0])
+            files.append((start, end, path))
+        return files
+
+    def files_between(self, start: float, end: float) -> List[str]:
+        """Paths of archive files that may hold frames in [start, end]."""
+        return [path for s, e, path in self.files() if s <= end and e >= start]
+
+    def total_bytes(self) -> int:
+        return sum(os.path.getsize(path) for _, _, path in self.files())
+
+    def _recover(self):
+        """Finalize files left open by a previous run. Their live index
+        still lists every complete frame, so they are copied into a proper
+        AVI with idx1 and timestamps."""
+        for name in os.listdir(self.directory):
+            if not name.endswith(".avi" + LIVE_INDEX_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name[:-len(LIVE_INDEX_SUFFIX)])
+            if not os.path.exists(path):
+                os.remove(path + LIVE_INDEX_SUFFIX)
+                continue
+            tmp_path = path + ".tmp"
+            try:
+                with MjpegAviReader(path) as reader, MjpegAviWriter(tmp_path, self.fps, playback_fps=self.fps) as writer:
+                    timestamps = reader.frame_timestamps(self._start_from_name(path))
+                    for i, ts in enumerate(timestamps):
+                        writer.write_frame(reader.read_frame(i), ts)
+            except (OSError, ValueError) as err:
+                print("Could not recover time-lapse file:", path, err)
+                continue
+            if writer.frame_count:
+                os.replace(tmp_path, path)
+            else:
+                os.remove(tmp_path)
+                os.remove(path)
+            os.remove(path + LIVE_INDEX_SUFFIX)
+            print(f"Recovered time-lapse file {path} ({writer.frame_count} frames)")
+
+    # -------- recording --------
+    def offer(self, frame: Frame, timestamp: float) -> bool:
+        """Consider one captured frame. Returns True if it was archived."""
+        if timestamp - self._last_ts < self.interval_sec:
+            return False
+        self._last_ts = timestamp
+        small = frame.resized(self.width, self.height, rgb=False)
+        ok, encoded = cv2.imencode(".jpg", small, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            return False
+        self.add(timestamp, encoded.tobytes())
+        return True
+
+    def add(self, timestamp: float, jpeg: bytes):
+        """Append one frame, starting a new file when the local day changes."""
+        day = datetime.date.fromtimestamp(timestamp)
+        with self._lock:
+            if self._writer is None or day != self._day:
+                self._close_writer()
+                name = TIMELAPSE_PREFIX + time.strftime(TIMELAPSE_NAME_FORMAT, time.localtime(timestamp)) + ".avi"
+                self._writer = MjpegAviWriter(os.path.join(self.directory, name), self.fps,
+                                              self.width, self.height, live=True, playback_fps=self.fps)
+                self._day = day
+            self._writer.write_frame(jpeg, timestamp)
+            self.frames_written += 1
+
+    def _close_writer(self):
+        if self._writer is None:
+            return
+        if self._writer.frame_count:
+            self._writer.close()
+        else:
+            self._writer.abort()
+        self._writer = None
+        self._day = None
+
+    def close(self):
+        """Finalize the open file."""
+        with self._lock:
+            self._close_writer()
+
+    # -------- reading --------
+    def frames(self, start: float, end: float, max_count: int | None = None) -> List[tuple[float, bytes]]:
+        """(timestamp, jpeg) frames in [start, end], evenly thinned to
+        max_count if given. Includes the file currently being written."""
+        selected = []
+        for path in self.files_between(start, end):
+            try:
+                with MjpegAviReader(path) as reader:
+                    timestamps = reader.frame_timestamps(self._start_from_name(path))
+                    selected.extend((path, i, ts) for i, ts in enumerate(timestamps) if start <= ts <= end)
+            except (OSError, ValueError) as err:
+                print("Skipping unreadable time-lapse file:", path, err)
+
+        if max_count and len(selected) > max_count:
+            step = len(selected) / max_count
+            selected = [selected[int(i * step)] for i in range(max_count)]
+
+        frames = []
+        reader = None
+        for path, i, ts in selected:
+            if reader is None or reader.path != path:
+                if reader is not None:
+                    reader.close()
+                reader = MjpegAviReader(path)
+            frames.append((ts, reader.read_frame(i)))
+        if reader is not None:
+            reader.close()
+        return frames
+
+    # -------- retention --------
+    def prune(self, max_age_sec: float | None, max_total_bytes: int | None,
+              now: float | None = None) -> tuple[int, int]:
+        """Delete whole files older than max_age_sec, then oldest first until
+        the archive fits max_total_bytes. The open file is never deleted.
+        Returns (files removed, bytes reclaimed)."""
+        now = now or time.time()
+        with self._lock:
+            current = self._writer.path if self._writer is not None else None
+            files = [(end, path, os.path.getsize(path)) for _, end, path in self.files()]
+            remaining = sum(size for _, _, size in files)
+
+            removed, reclaimed = 0, 0
+            for end, path, size in files:
+                if path == current:
+                    break
+                too_old = max_age_sec is not None and end < now - max_age_sec
+                too_big = max_total_bytes is not None and remaining > max_total_bytes
+                if not (too_old or too_big):
+                    break
+                try:
+                    os.remove(path)
+                except OSError as err:
+                    print("Failed to remove:", path, "Error:", err)
+                    continue
+                remaining -= size
+                removed += 1
+                reclaimed += size
+            return removed, reclaimed
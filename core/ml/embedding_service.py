@@ -0,0 +1,110 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, NamedTuple
+import numpy as np
+
+from core.camera_manager.frame import Frame
+
+# How long the first request of a batch waits for others to join it
+BATCH_WINDOW_SEC = 0.01
+MAX_BATCH = 32
+
+
+class _Request(NamedTuple):
+    frame: Frame
+    rois: List[tuple[int, int, int, int]]
+    future: Future
+
+
+class EmbeddingService:
+    """Micro-batches MobileNetV3 embedding requests across callers.
+
+    SeeDos evaluating the same frame on their own threads submit their
+    ROIs here instead of calling the model each. Requests arriving within
+    window_sec of the first one are merged, identical ROIs of the same frame
+    are embedded once, and the crops run as batches of at most max_batch.
+    Each caller gets its own rows back through a Future.
+
+    ROIs are pixel (x1, y1, x2, y2) in the frame's lores RGB view.
+    """
+    def __init__(self, model, window_sec=BATCH_WINDOW_SEC, max_batch=MAX_BATCH):
+        self.model = model
+        self.window_sec = window_sec
+        self.max_batch = max_batch
+
+        self._cond = threading.Condition()
+        self._pending: List[_Request] = []
+        self._pending_crops = 0
+
+        self.crops_requested = 0
+        self.crops_embedded = 0
+        self.batches_run = 0
+
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def submit(self, frame: Frame, rois) -> Future:
+        """Queue the ROIs of frame. The Future resolves to an (len(rois), D)
+        array of embeddings in the same order."""
+        future = Future()
+        rois = [tuple(int(v) for v in roi) for roi in rois]
+        if not rois:
+            future.set_result(np.empty((0, 0), dtype=np.float32))
+            return future
+        with self._cond:
+            self._pending.append(_Request(frame, rois, future))
+            self._pending_crops += len(rois)
+            self._cond.notify()
+        return future
+
+    def embed(self, frame: Frame, rois, timeout: float | None = None) -> np.ndarray:
+        """Blocking submit()."""
+        return self.submit(frame, rois).result(timeout)
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                deadline = time.monotonic() + self.window_sec
+                while self._pending_crops < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                requests, self._pending = self._pending, []
+                self._pending_crops = 0
+            self._run(requests)
+
+    def _run(self, requests: List[_Request]):
+        # Requests keep their frames alive, so id() is stable for this batch
+        unique = {}
+        crops = []
+        rows = []
+        try:
+            for request in requests:
+                indices = []
+                for roi in request.rois:
+                    key = (id(request.frame), roi)
+                    if key not in unique:
+                        unique[key] = len(crops)
+                        crops.append(self.model.slice_roi(request.frame.lores_rgb, roi))
+                    indices.append(unique[key])
+                rows.append(indices)
+
+            embeddings = np.concatenate([
+                self.model.get_embedding_batch(crops[i:i + self.max_batch])
+                for i in range(0, len(crops), self.max_batch)
+            ])
+        except Exception as err:
+            print("Embedding batch failed:", err)
+            for request in requests:
+                request.future.set_exception(err)
+            return
+
+        self.crops_requested += sum(len(r.rois) for r in requests)
+        self.crops_embedded += len(crops)
+        self.batches_run += 1
+        for request, indices in zip(requests, rows):
+            request.future.set_result(embeddings[indices])
@@ -6,26 +6,50 @@ import os
 import threading
 import time
 import cv2 as cv2
+from core.camera_manager.frame import Frame
+from core.ml.stereo_depth import StereoDepth
+from core.ml.onnx_fuse import prefer_fused
+from core.ml.embedding_service import EmbeddingService
+
+# Inference calls allowed to run at once across all models. Each session
+# already uses several threads, more concurrent runs only oversubscribe the CPU.
+INFERENCE_SLOTS = 2
+
+MOBILENET_INPUT_SIZE = 224
+# ImageNet normalization, float32 so nothing is promoted to float64
+IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+IMAGENET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
 
 
 class ML_manager:
-  def __init__(self):
+  """One instance of each model, shared by every camera and SeeDo."""
+  def __init__(self, inference_slots=INFERENCE_SLOTS):
       self.mobile_net_v3 = None
+      # Batches ROI embeddings across SeeDos and the UI preview
+      self.embedding_service = None
       self.depth_anything_v2_vits_518 = None
       self.depth_anything_v2_vits_378 = None
+      self.stereo_depth = None
+      self.inference_slots = threading.BoundedSemaphore(inference_slots)
    
   def Load_MobileNetV3(self):
-    self.mobile_net_v3 = MobileNetV3()
+    self.mobile_net_v3 = MobileNetV3(self.inference_slots)
+    self.embedding_service = EmbeddingService(self.mobile_net_v3)
   
   def Load_DepthAnythingV2(self):
     print('loading depth anything v2')
-    self.depth_anything_v2_vits_378 = DepthAnythingV2(378)
+    self.depth_anything_v2_vits_378 = DepthAnythingV2(378, self.inference_slots)
+
+  def Load_StereoDepth(self, params_path, scale=0.5, vflip=False):
+    print('loading stereo depth')
+    self.stereo_depth = StereoDepth(params_path, scale=scale, vflip=vflip)
 
 class DepthAnythingV2:
 
-  def __init__(self, model_resolution = 378):
+  def __init__(self, model_resolution = 378, inference_slots=None):
 
     self._lock = threading.Lock()
+    self._inference_slots = inference_slots or threading.BoundedSemaphore(1)
 
     self.model_resolution = model_resolution
     self.last_depth_map = None
@@ -37,14 +61,23 @@ class DepthAnythingV2:
     self._worker = None
     self._run_event = threading.Event()
   
-    model_path = self._download_models(model_resolution)
+    model_path = prefer_fused(self._download_models(model_resolution))
     self.session = self._create_session(model_path)
+    self.input_name = self.session.get_inputs()[0].name
+    # Variants built by core.ml.onnx_fuse take the uint8 RGB frame as is
+    self.uint8_input = self.session.get_inputs()[0].type == "tensor(uint8)"
 
     
   def request_depth(self, frame):
-    reszied_frame = cv2.resize(frame, (self.model_resolution, self.model_resolution), interpolation=cv2.INTER_NEAREST)
+    """frame is a Frame (uses its cached model-size view) or an RGB array."""
+    size = self.model_resolution
+    if isinstance(frame, Frame):
+      # Cached views are shared and must not be modified, no copy needed
+      resized_frame = frame.resized(size, size, interpolation=cv2.INTER_NEAREST)
+    else:
+      resized_frame = cv2.resize(frame, (size, size), interpolation=cv2.INTER_NEAREST)
     with self._lock:
-      self._pending_frame = reszied_frame.copy()
+      self._pending_frame = resized_frame
 
   def start_running_depth_map(self):
     if self._worker and self._worker.is_alive():
@@ -95,9 +128,13 @@ class DepthAnythingV2:
 
   def get_depth_map(self, frame: np.ndarray) -> np.ndarray:
     """The image size must match the model loaded"""
-    inp = np.transpose(frame.astype(np.float32) / 255.0, (2,0,1))[None]
+    if self.uint8_input:
+      inp = np.ascontiguousarray(frame)[None]
+    else:
+      inp = np.transpose(frame.astype(np.float32) / 255.0, (2,0,1))[None]
     print('starting inference')
-    return self.session.run(None, {"input": inp})[0][0]
+    with self._inference_slots:
+      return self.session.run(None, {self.input_name: inp})[0][0]
 
   def _download_models(self, model_resolution):
     model = f"depth_anything_vits_{model_resolution}.onnx"
@@ -117,25 +154,47 @@ class DepthAnythingV2:
     return MODEL_PATH
 
 class MobileNetV3:
-  def __init__(self):
-    self.session = ort.InferenceSession("core/ml/mobilenetv3_embed_batch.onnx")
+  """Embeddings from MobileNetV3 for PIL images or RGB arrays.
+
+  Preprocessing is batched: every ROI is resized with cv2 into one uint8
+  NHWC staging tensor, then scaled and shifted into the NCHW float32 input
+  in a single pass, (x / 255 - mean) / std folded into x * scale + bias.
+  Both tensors are preallocated per thread and grow with the batch size.
+  With the uint8 NHWC variant from core.ml.onnx_fuse the staging tensor
+  is the model input and the normalization runs inside ORT.
+  """
+  def __init__(self, inference_slots=None):
+    self.session = ort.InferenceSession(prefer_fused("core/ml/mobilenetv3_embed_batch.onnx"))
     self.input_name = self.session.get_inputs()[0].name
+    self.uint8_input = self.session.get_inputs()[0].type == "tensor(uint8)"
+    self._inference_slots = inference_slots or threading.BoundedSemaphore(1)
+    self.input_size = MOBILENET_INPUT_SIZE
+    self._scale = (1.0 / (255.0 * IMAGENET_STD)).reshape(1, 3, 1, 1)
+    self._bias = (-IMAGENET_MEAN / IMAGENET_STD).reshape(1, 3, 1, 1)
+    self._buffers = threading.local()
+
+  def _run(self, batch: np.ndarray) -> np.ndarray:
+    with self._inference_slots:
+      return self.session.run(None, {self.input_name: batch})[0]
 
   def get_image_embedding(self, pil: Image.Image) -> np.ndarray:
-    batch = np.vstack([self.preprocess(pil)])   # list for batching
-    out = self.session.run(None, {self.input_name: batch})[0]
+    out = self._run(self.preprocess_batch([pil]))
     return out.squeeze()                        # (576,)
 
   def get_image_embedding_batch(self, imgs: list[Image.Image]) -> np.ndarray:
-    batch = np.vstack([self.preprocess(img) for img in imgs])
-    out = self.session.run(None, {self.input_name: batch})[0]
+    out = self._run(self.preprocess_batch(imgs))
     return out.squeeze()    
 
-  def get_embedding_batch(self, imgs: list[Image.Image]):
-    batch = np.vstack([self.preprocess(img) for img in imgs])
-    out = self.session.run(None, {self.input_name: batch})[0] # run inference
+  def get_embedding_batch(self, imgs: list[Image.Image | np.ndarray]):
+    """imgs are PIL images or RGB uint8 arrays (e.g. ROI slices of a frame)."""
+    out = self._run(self.preprocess_batch(imgs)) # run inference
     return out  # (N, embedding_dim)
 
+  def get_embedding_rois(self, rgb: np.ndarray, rois: list[tuple[int, int, int, int]]) -> np.ndarray:
+    """Embeddings of pixel ROIs (x1, y1, x2, y2) of one RGB frame, sliced
+    without copying."""
+    return self.get_embedding_batch([self.slice_roi(rgb, roi) for roi in rois])
+
   def cosine_similarity_matrix(self, embeddings):
     # Normalize row-wise
     norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
@@ -146,17 +205,49 @@ class MobileNetV3:
     return sim_matrix  
 
   def preprocess(self, pil: Image.Image) -> np.ndarray:
-    #Note: do I care about resize options?
-    img = pil.resize((224, 224), Image.Resampling.LANCZOS)
-    arr = np.array(img).astype(np.float32) / 255.0
+    """Model input for one image, (1,3,224,224) float32 or (1,224,224,3)
+    uint8 for the fused variant."""
+    return self.preprocess_batch([pil]).copy()
+
+  def _batch_buffers(self, n: int) -> tuple[np.ndarray, np.ndarray | None]:
+    """This thread's staging and input tensors, at least n images long."""
+    buffers = self._buffers
+    if getattr(buffers, "capacity", 0) < n:
+      size = self.input_size
+      buffers.staging = np.empty((n, size, size, 3), dtype=np.uint8)
+      buffers.batch = None if self.uint8_input else np.empty((n, 3, size, size), dtype=np.float32)
+      buffers.capacity = n
+    return buffers.staging[:n], None if buffers.batch is None else buffers.batch[:n]
+
+  def preprocess_batch(self, imgs: list[Image.Image | np.ndarray]) -> np.ndarray:
+    """Model input for PIL images or RGB uint8 arrays: (N,3,224,224)
+    float32, or the (N,224,224,3) uint8 staging tensor for the fused variant.
 
-    # ImageNet normalization values
-    mean = np.array([0.485, 0.456, 0.406])
-    std  = np.array([0.229, 0.224, 0.225])
+    The result is a view of this thread's preallocated buffer, valid until
+    the next call from the same thread.
+    """
+    size = self.input_size
+    staging, batch = self._batch_buffers(len(imgs))
+    for i, img in enumerate(imgs):
+      arr = np.asarray(img)
+      h, w = arr.shape[:2]
+      # Area averaging when shrinking, cubic when a small ROI is enlarged
+      interpolation = cv2.INTER_AREA if w >= size and h >= size else cv2.INTER_CUBIC
+      cv2.resize(arr, (size, size), dst=staging[i], interpolation=interpolation)
+    if self.uint8_input:
+      return staging
+    # HWC -> CHW and normalization in one float32 multiply-add over the batch
+    np.multiply(staging.transpose(0, 3, 1, 2), self._scale, out=batch)
+    batch += self._bias
+    return batch
 
-    arr = (arr - mean) / std   # normalize
-    arr = arr.transpose(2, 0, 1)  # HWC -> CHW
-    return arr[np.newaxis, ...].astype(np.float32)   # (1,3,224,224)
+  @staticmethod
+  def slice_roi(rgb: np.ndarray, roi: tuple[int, int, int, int]) -> np.ndarray:
+    """View of roi in rgb, at least one pixel even for a degenerate ROI."""
+    x1, y1, x2, y2 = (int(v) for v in roi)
+    h, w = rgb.shape[:2]
+    x1, y1 = min(max(x1, 0), w - 1), min(max(y1, 0), h - 1)
+    return rgb[y1:max(min(y2, h), y1 + 1), x1:max(min(x2, w), x1 + 1)]
   
   def slice_roi_from_image(self, pil: Image.Image, roi: tuple[int, int, int, int]) -> Image.Image:
     x1, y1, x2, y2 = roi
@@ -0,0 +1,117 @@
+"""Build model variants that take raw uint8 NHWC images.
+
+The variant prepends Cast -> Transpose(NHWC -> NCHW) -> Mul -> Add to the
+graph, so the float conversion, layout change and normalization run in
+ORT's kernels instead of as float32 copies in numpy. It is saved next to
+the original as <name>_u8nhwc.onnx, and ML_manager uses it automatically
+when it exists.
+
+    python -m core.ml.onnx_fuse core/ml/mobilenetv3_embed_batch.onnx --imagenet
+    python -m core.ml.onnx_fuse models/depth_anything_vits_378.onnx
+
+Needs the onnx package (pip install onnx), only for the conversion.
+Resizing stays outside the graph: crops of any size are resized with cv2
+straight into the uint8 batch.
+"""
+import argparse
+import os
+import numpy as np
+
+FUSED_SUFFIX = "_u8nhwc"
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+
+def fused_model_path(model_path: str) -> str:
+    root, ext = os.path.splitext(model_path)
+    return root + FUSED_SUFFIX + ext
+
+
+def prefer_fused(model_path: str) -> str:
+    """The uint8 NHWC variant of model_path if it has been built, else model_path."""
+    fused = fused_model_path(model_path)
+    return fused if os.path.exists(fused) else model_path
+
+
+def fuse_preprocessing(src: str, dst: str | None = None, mean=(0.0, 0.0, 0.0), std=(1.0, 1.0, 1.0)) -> str:
+    """Write a copy of src whose input is uint8 NHWC and is normalized in
+    the graph as (x / 255 - mean) / std. Returns the path written."""
+    import onnx
+    from onnx import helper, numpy_helper, TensorProto
+
+    dst = dst or fused_model_path(src)
+    model = onnx.load(src)
+    graph = model.graph
+
+    initializers = {init.name for init in graph.initializer}
+    inputs = [i for i in graph.input if i.name not in initializers]
+    if len(inputs) != 1:
+        raise ValueError(f"Expected one image input, found {[i.name for i in inputs]}")
+    original = inputs[0]
+    dims = original.type.tensor_type.shape.dim
+    if len(dims) != 4:
+        raise ValueError(f"Expected an NCHW input, got rank {len(dims)}")
+
+    def dim(d):
+        return d.dim_param or d.dim_value or None
+
+    n, c, h, w = (dim(d) for d in dims)
+    if c not in (3, None):
+        raise ValueError(f"Expected 3 input channels, got {c}")
+
+    # x * scale + bias == (x / 255 - mean) / std
+    std = np.asarray(std, dtype=np.float32)
+    scale = (1.0 / (255.0 * std)).reshape(1, 3, 1, 1)
+    bias = (-np.asarray(mean, dtype=np.float32) / std).reshape(1, 3, 1, 1)
+
+    image_name = original.name + "_u8"
+    prefix = "u8nhwc_"
+    graph.initializer.extend([
+        numpy_helper.from_array(scale, prefix + "scale"),
+        numpy_helper.from_array(bias, prefix + "bias"),
+    ])
+    nodes = [
+        helper.make_node("Cast", [image_name], [prefix + "float"], to=TensorProto.FLOAT),
+        helper.make_node("Transpose", [prefix + "float"], [prefix + "nchw"], perm=[0, 3, 1, 2]),
+        helper.make_node("Mul", [prefix + "nchw", prefix + "scale"], [prefix + "scaled"]),
+        # Produces the tensor the original graph reads as its input
+        helper.make_node("Add", [prefix + "scaled", prefix + "bias"], [original.name]),
+    ]
+    for node in reversed(nodes):
+        graph.node.insert(0, node)
+
+    new_input = helper.make_tensor_value_info(image_name, TensorProto.UINT8, [n, h, w, 3])
+    index = list(graph.input).index(original)
+    graph.input.remove(original)
+    graph.input.insert(index, new_input)
+
+    onnx.checker.check_model(model, full_check=False)
+    # Keep the weights in an external file when the original does
+    external = os.path.exists(src + ".data")
+    onnx.save(model, dst, save_as_external_data=external,
+              location=os.path.basename(dst) + ".data" if external else None)
+    print(f"Wrote {dst}: input '{image_name}' uint8 [{n}, {h}, {w}, 3]")
+    return dst
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Build a uint8 NHWC input variant of an ONNX model.")
+    parser.add_argument("model", help="ONNX model with one float32 NCHW image input")
+    parser.add_argument("--output", default=None, help=f"default: <model>{FUSED_SUFFIX}.onnx")
+    parser.add_argument("--imagenet", action="store_true",
+                        help="normalize with ImageNet mean/std (MobileNet); default is x / 255 only")
+    args = parser.parse_args(argv)
+    try:
+        import onnx  # noqa: F401
+    except ImportError:
+        print("The onnx package is needed for the conversion: pip install onnx")
+        return 1
+    if args.imagenet:
+        fuse_preprocessing(args.model, args.output, IMAGENET_MEAN, IMAGENET_STD)
+    else:
+        fuse_preprocessing(args.model, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,209 @@
+import hashlib
+import os
+import threading
+import time
+import cv2
+import numpy as np
+
+from core.camera_manager.frame import Frame
+
+STEREO_CACHE_DIR = "models/stereo"
+# Resolution the calibration images were taken at (dual_cam prototype)
+CALIBRATION_SIZE = (1536, 864)
+
+
+class StereoDepth:
+    """Metric depth from a calibrated stereo pair, same interface as DepthAnythingV2.
+
+    Rectification maps are built for the scaled output size, so remap does
+    undistortion, rectification and downscaling in one pass. They are stored
+    as fixed-point CV_16SC2 and cached on disk, keyed by the calibration
+    file, input size and scale. SGBM runs on the reduced grayscale pair,
+    and only over roi_box when one is set.
+
+    last_depth_map is float32 metres at the reduced resolution, 0 where
+    no depth could be matched.
+
+    With vflip=True the cameras deliver vertically flipped frames (the Pi
+    capture flips in the ISP) while the calibration was taken unflipped.
+    The grayscale pair is flipped back before remapping, and the depth map
+    is flipped again so it lines up with the frames and roi_box.
+    """
+    def __init__(self, params_path, scale=0.5, num_disparities=160, block_size=5,
+                 calibration_size=CALIBRATION_SIZE, cache_dir=STEREO_CACHE_DIR, vflip=False):
+        self._lock = threading.Lock()
+        self.params_path = params_path
+        self.scale = scale
+        self.calibration_size = calibration_size
+        self.cache_dir = cache_dir
+        self.vflip = vflip
+
+        self.last_depth_map = None
+        self.last_depth_ts = 0.0
+        # Normalized (x1, y1, x2, y2) to limit matching to, None = whole frame
+        self.roi_box = None
+
+        self._pending_pair = None
+        self._worker = None
+        self._run_event = threading.Event()
+
+        with open(params_path, "rb") as f:
+            self._params_digest = hashlib.sha1(f.read()).hexdigest()[:16]
+        self._params = dict(np.load(params_path, allow_pickle=True))
+
+        # Built on the first pair, once the input size is known
+        self._input_size = None
+        self._maps = None
+        self.focal_px = 0.0
+        self.baseline_m = 0.0
+
+        # Disparity range shrinks with the image
+        self.num_disparities = max(16, int(round(num_disparities * scale / 16)) * 16)
+        self.matcher = cv2.StereoSGBM_create(
+            minDisparity=0,
+            numDisparities=self.num_disparities,
+            blockSize=block_size,
+            P1=8 * block_size ** 2,
+            P2=32 * block_size ** 2,
+            uniquenessRatio=5,
+            speckleWindowSize=80,
+            speckleRange=2,
+            disp12MaxDiff=1
+        )
+
+    # -------- same interface as DepthAnythingV2 --------
+    def request_depth(self, left, right):
+        """Queue a pair (Frames or BGR arrays) for the worker, replacing any
+        pair that hasn't been processed yet."""
+        pair = (self._gray(left), self._gray(right))
+        with self._lock:
+            self._pending_pair = pair
+
+    def start_running_depth_map(self):
+        if self._worker and self._worker.is_alive():
+            return
+        self._run_event.set()
+        self._worker = threading.Thread(target=self._depth_map_worker, daemon=True)
+        self._worker.start()
+
+    def stop_running_depth_map(self):
+        self._run_event.clear()
+
+    def _depth_map_worker(self):
+        while self._run_event.is_set():
+            pair = None
+            with self._lock:
+                if self._pending_pair is not None:
+                    pair = self._pending_pair
+                    self._pending_pair = None
+
+            if pair is not None:
+                try:
+                    self.last_depth_map = self.get_depth_map(*pair)
+                    self.last_depth_ts = time.time()
+                except cv2.error as err:
+                    print("Stereo depth failed:", err)
+
+            time.sleep(0.05)
+
+        print('_depth_map_worker is terminating')
+
+    def raw_to_gray_scale(self, depth: np.ndarray) -> np.ndarray:
+        """Near = bright, unmatched pixels black, like the DepthAnything view."""
+        valid = depth > 0
+        gray = np.zeros(depth.shape, dtype=np.uint8)
+        if valid.any():
+            inverse = np.zeros(depth.shape, dtype=np.float32)
+            np.divide(1.0, depth, out=inverse, where=valid)
+            lo, hi = inverse[valid].min(), inverse[valid].max()
+            if hi > lo:
+                gray[valid] = ((inverse[valid] - lo) / (hi - lo) * 254 + 1).astype(np.uint8)
+        return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+
+    # -------- depth --------
+    @staticmethod
+    def _gray(image) -> np.ndarray:
+        if isinstance(image, Frame):
+            return image.gray
+        if image.ndim == 2:
+            return image
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+    def get_depth_map(self, left_gray: np.ndarray, right_gray: np.ndarray) -> np.ndarray:
+        """Depth in metres for a grayscale pair at capture resolution."""
+        if self.vflip:
+            # The rectification maps describe the unflipped sensor image
+            left_gray, right_gray = cv2.flip(left_gray, 0), cv2.flip(right_gray, 0)
+        input_size = (left_gray.shape[1], left_gray.shape[0])
+        if self._maps is None or input_size != self._input_size:
+            self._load_maps(input_size)
+        mapL1, mapL2, mapR1, mapR2 = self._maps
+        out_h, out_w = mapL1.shape[:2]
+
+        # Match only inside the ROI box. The left image needs num_disparities
+        # extra columns to its left for the search, which are cut off again.
+        x1, y1, x2, y2 = 0, 0, out_w, out_h
+        if self.roi_box is not None:
+            bx1, by1, bx2, by2 = self.roi_box
+            if self.vflip:
+                by1, by2 = 1 - by2, 1 - by1
+            x1, y1 = int(bx1 * out_w), int(by1 * out_h)
+            x2, y2 = max(int(np.ceil(bx2 * out_w)), x1 + 1), max(int(np.ceil(by2 * out_h)), y1 + 1)
+        xs = max(0, x1 - self.num_disparities)
+
+        # Remapping with the sub-maps rectifies just the region we need
+        rectL = cv2.remap(left_gray, mapL1[y1:y2, xs:x2], mapL2[y1:y2, xs:x2], cv2.INTER_LINEAR)
+        rectR = cv2.remap(right_gray, mapR1[y1:y2, xs:x2], mapR2[y1:y2, xs:x2], cv2.INTER_LINEAR)
+        disparity = self.matcher.compute(rectL, rectR)[:, x1 - xs:].astype(np.float32) / 16.0
+
+        depth = np.zeros((out_h, out_w), dtype=np.float32)
+        region = depth[y1:y2, x1:x2]
+        valid = disparity > 0
+        region[valid] = (self.focal_px * self.baseline_m) / disparity[valid]
+        return cv2.flip(depth, 0) if self.vflip else depth
+
+    def _load_maps(self, input_size):
+        """Load the rectification maps for input_size from the disk cache, or
+        build and cache them."""
+        key = f"{self._params_digest}_{input_size[0]}x{input_size[1]}_s{self.scale}"
+        cache_path = os.path.join(self.cache_dir, f"stereo_maps_{key}.npz")
+        if os.path.exists(cache_path):
+            cached = np.load(cache_path)
+            self._maps = (cached["mapL1"], cached["mapL2"], cached["mapR1"], cached["mapR2"])
+            self.focal_px = float(cached["focal_px"])
+            self.baseline_m = float(cached["baseline_m"])
+            self._input_size = input_size
+            print(f"Loaded stereo rectification maps from {cache_path}")
+            return
+
+        p = self._params
+        # Intrinsics scale with resolution when capturing at a different
+        # size than the calibration (same sensor mode assumed)
+        sx = input_size[0] / self.calibration_size[0]
+        sy = input_size[1] / self.calibration_size[1]
+        to_input = np.array([[sx, 0, 0], [0, sy, 0], [0, 0, 1]])
+        mtxL, mtxR = to_input @ p["mtxL"], to_input @ p["mtxR"]
+
+        R1, R2, P1, P2, _, _, _ = cv2.stereoRectify(
+            mtxL, p["distL"], mtxR, p["distR"], input_size, p["R"], p["T"],
+            flags=cv2.CALIB_ZERO_DISPARITY, alpha=0
+        )
+        focal_full = P1[0, 0]
+        self.baseline_m = float(-P2[0, 3] / focal_full)
+
+        # Project straight into the reduced output image
+        out_size = (int(input_size[0] * self.scale), int(input_size[1] * self.scale))
+        P1s, P2s = P1.copy(), P2.copy()
+        P1s[:2] *= self.scale
+        P2s[:2] *= self.scale
+        self.focal_px = float(P1s[0, 0])
+        mapL1, mapL2 = cv2.initUndistortRectifyMap(mtxL, p["distL"], R1, P1s, out_size, cv2.CV_16SC2)
+        mapR1, mapR2 = cv2.initUndistortRectifyMap(mtxR, p["distR"], R2, P2s, out_size, cv2.CV_16SC2)
+        self._maps = (mapL1, mapL2, mapR1, mapR2)
+        self._input_size = input_size
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        np.savez(cache_path, mapL1=mapL1, mapL2=mapL2, mapR1=mapR1, mapR2=mapR2,
+                 focal_px=self.focal_px, baseline_m=self.baseline_m)
+        print(f"Stereo rectification: {out_size[0]}x{out_size[1]}, "
+              f"baseline {self.baseline_m * 1000:.1f} mm, cached to {cache_path}")
@@ -0,0 +1,100 @@
+from typing import Dict
+import numpy as np
+
+
+class SemanticPlan:
+    """Semantic similarity SeeDos compiled into flat arrays for evaluation.
+
+    Row r of every array is one region: its ROI, its L2-normalized reference
+    embedding, threshold, direction and the SeeDo it belongs to. Evaluating
+    a frame is then one batched embedding request, one row-wise dot product
+    for all similarities and vectorized threshold masks, reduced per SeeDo.
+    The pydantic SemanticRegion models stay the config layer only.
+
+    SeeDos are evaluated through their own RoiChangeGate, so unchanged
+    regions still reuse their last similarity.
+    """
+    def __init__(self, seedos: list):
+        self.seedos = list(seedos)
+        regions = [(s, i, region) for s, seedo in enumerate(self.seedos)
+                   for i, region in enumerate(seedo.semantic_regions)]
+
+        self.seedo_index = np.array([s for s, _, _ in regions], dtype=np.int32)
+        self.local_index = np.array([i for _, i, _ in regions], dtype=np.int32)
+        self.rois = np.array([r.roi for _, _, r in regions], dtype=np.float32).reshape(-1, 4)
+        self.normalized = np.array([r.normalized for _, _, r in regions], dtype=bool)
+        self.thresholds = np.array([r.similarity_threshold for _, _, r in regions], dtype=np.float32)
+        self.greater_than = np.array([r.greater_than for _, _, r in regions], dtype=bool)
+
+        if regions:
+            references = np.stack([np.asarray(r.embedding, dtype=np.float32).reshape(-1) for _, _, r in regions])
+            references /= np.maximum(np.linalg.norm(references, axis=1, keepdims=True), 1e-12)
+        else:
+            references = np.empty((0, 0), dtype=np.float32)
+        self.references = references
+
+        self._pixel_cache: Dict[tuple, np.ndarray] = {}
+
+    def __len__(self):
+        return len(self.seedo_index)
+
+    def pixel_rois(self, width: int, height: int, main_size: tuple[int, int]) -> np.ndarray:
+        """int32 (R, 4) ROIs on a width x height stream, same mapping as
+        SemanticRegion.pixel_roi. Cached per stream size."""
+        key = (width, height, *main_size)
+        cached = self._pixel_cache.get(key)
+        if cached is not None:
+            return cached
+        main_w, main_h = main_size
+        rois = np.where(self.normalized[:, None], self.rois,
+                        self.rois / np.array([main_w, main_h, main_w, main_h], dtype=np.float32))
+        pixels = np.round(rois * np.array([width, height, width, height], dtype=np.float32)).astype(np.int32)
+        # Never collapse to an empty crop on small streams
+        pixels[:, 2] = np.maximum(pixels[:, 2], pixels[:, 0] + 1)
+        pixels[:, 3] = np.maximum(pixels[:, 3], pixels[:, 1] + 1)
+        self._pixel_cache[key] = pixels
+        return pixels
+
+    def evaluate(self, frame, timestamp: float, ml_manager, seedos: list | None = None) -> Dict[object, bool]:
+        """Evaluate seedos (default: all in the plan) on frame. Returns
+        {seedo: triggered}."""
+        positions = range(len(self.seedos)) if seedos is None else [self.seedos.index(s) for s in seedos]
+        active = np.zeros(len(self.seedos), dtype=bool)
+        active[list(positions)] = True
+        rows = np.flatnonzero(active[self.seedo_index])
+
+        rgb = frame.lores_rgb
+        h, w = rgb.shape[:2]
+        rois = self.pixel_rois(w, h, (frame.width, frame.height))
+
+        similarities = np.zeros(len(self), dtype=np.float32)
+        changed = []
+        signatures = {}
+        for r in rows:
+            gate = self.seedos[self.seedo_index[r]].change_gate
+            roi = tuple(rois[r].tolist())
+            signature = gate.signature(rgb, roi)
+            cached = gate.lookup(int(self.local_index[r]), roi, signature, timestamp)
+            if cached is None:
+                changed.append(r)
+                signatures[r] = signature
+            else:
+                similarities[r] = cached.similarity
+
+        if changed:
+            changed = np.array(changed)
+            # One request for every changed region of every SeeDo in the plan
+            embeddings = np.asarray(ml_manager.embedding_service.embed(frame, rois[changed]), dtype=np.float32)
+            embeddings = embeddings.reshape(len(changed), -1)
+            normalized = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+            similarities[changed] = np.einsum("ij,ij->i", normalized, self.references[changed])
+            for r, embedding in zip(changed, embeddings):
+                gate = self.seedos[self.seedo_index[r]].change_gate
+                roi = tuple(rois[r].tolist())
+                gate.store(int(self.local_index[r]), roi, signatures[r], embedding,
+                           float(similarities[r]), timestamp)
+
+        hits = np.where(self.greater_than, similarities > self.thresholds, similarities < self.thresholds)
+        triggered = np.zeros(len(self.seedos), dtype=bool)
+        np.logical_or.at(triggered, self.seedo_index[rows], hits[rows])
+        return {self.seedos[p]: bool(triggered[p]) for p in positions}
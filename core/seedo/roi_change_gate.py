@@ -0,0 +1,79 @@
+import threading
+from typing import Dict, NamedTuple, Tuple
+import cv2
+import numpy as np
+
+# Side of the tiny grayscale crop that is compared
+SIGNATURE_SIZE = 16
+
+
+class _Embedded(NamedTuple):
+    roi: Tuple[int, int, int, int]
+    signature: np.ndarray
+    embedding: np.ndarray
+    similarity: float
+    timestamp: float
+
+
+class RoiChangeGate:
+    """Skips re-embedding regions whose pixels have not changed.
+
+    Each region keeps a tiny grayscale copy of the crop its last embedding
+    was computed from. A new crop whose largest per-cell absolute
+    difference from it is within tolerance (0-255 gray levels) reuses the
+    stored embedding and similarity. The max rather than the mean, so a
+    small object covering a few cells is not averaged away. Comparing against the embedded crop, not the previous
+    frame, keeps slow drift from accumulating unnoticed. Results older than
+    max_age_sec are recomputed regardless. tolerance 0 disables the gate.
+    """
+    def __init__(self, tolerance=0.0, max_age_sec: float | None = 60.0, size=SIGNATURE_SIZE):
+        self.tolerance = tolerance
+        self.max_age_sec = max_age_sec
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._regions: Dict[int, _Embedded] = {}
+        self._lock = threading.Lock()
+
+    def signature(self, rgb: np.ndarray, roi: Tuple[int, int, int, int]) -> np.ndarray:
+        x1, y1, x2, y2 = roi
+        crop = rgb[y1:y2, x1:x2]
+        if crop.size == 0:
+            return np.zeros((self.size, self.size), dtype=np.uint8)
+        small = cv2.resize(crop, (self.size, self.size), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+
+    def lookup(self, index: int, roi, signature: np.ndarray, timestamp: float) -> _Embedded | None:
+        """The stored result for region index if its crop is unchanged,
+        else None. Counts a hit or a miss."""
+        with self._lock:
+            previous = self._regions.get(index)
+            reusable = (
+                self.tolerance > 0
+                and previous is not None
+                and previous.roi == tuple(roi)
+                and (self.max_age_sec is None or timestamp - previous.timestamp <= self.max_age_sec)
+                and cv2.absdiff(signature, previous.signature).max() <= self.tolerance
+            )
+            if reusable:
+                self.hits += 1
+                return previous
+            self.misses += 1
+            return None
+
+    def store(self, index: int, roi, signature: np.ndarray, embedding: np.ndarray,
+              similarity: float, timestamp: float):
+        with self._lock:
+            self._regions[index] = _Embedded(tuple(roi), signature, embedding, similarity, timestamp)
+
+    def reset(self):
+        with self._lock:
+            self._regions.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -2,6 +2,7 @@ from pydantic import BaseModel, Field
 from typing import Dict, Any, Tuple, List, Optional
 from PIL import Image
 import numpy as np
+from core.camera_manager.constants import DEFAULT_CAMERA
 
 class ActionSchema(BaseModel):
     type: str
@@ -19,18 +20,33 @@ class SeeDoSchema(BaseModel):
     interval_sec: float
     min_retrigger_interval_sec: float = 0.0
     enabled: bool = True
+    # Camera whose frames this SeeDo evaluates
+    camera: str = DEFAULT_CAMERA
     config: Dict[str, Any]
     action: ActionSchema
 
 class BrightnessConfigSchema(BaseModel):
     threshold: float
 
+def roi_to_pixels(roi: Tuple[float, float, float, float], width: int, height: int) -> Tuple[int, int, int, int]:
+    """Map a normalized (x1, y1, x2, y2) ROI onto a width x height image."""
+    x1, y1, x2, y2 = roi
+    px1, py1 = round(x1 * width), round(y1 * height)
+    # Never collapse to an empty crop on small streams
+    return px1, py1, max(round(x2 * width), px1 + 1), max(round(y2 * height), py1 + 1)
+
 class SemanticRegion(BaseModel):
-    roi: Tuple[int, int, int, int]
+    # (x1, y1, x2, y2) as fractions of the frame when normalized, so one ROI
+    # maps onto any stream. Older configs stored main-stream pixels.
+    roi: Tuple[float, float, float, float]
+    normalized: bool = False
     embedding_path: str       # reference to .npy file
     image_path: str           # cropped ROI image
     similarity_threshold: float
     greater_than: bool = True
+    # True when the reference embedding was taken from the lores stream the
+    # region is evaluated on. Older configs embedded full-resolution crops.
+    lores_reference: bool = False
 
     # Runtime-only fields (not part of saved JSON)
     image: Optional[Image.Image] = Field(default=None, exclude=True)
@@ -39,6 +55,18 @@ class SemanticRegion(BaseModel):
     class Config:
         arbitrary_types_allowed = True   # Required to support Image & numpy types
 
+    def pixel_roi(self, width: int, height: int, main_size: Tuple[int, int]) -> Tuple[int, int, int, int]:
+        """ROI in pixels of a width x height stream. main_size is only used
+        to interpret legacy pixel ROIs."""
+        roi = self.roi
+        if not self.normalized:
+            main_w, main_h = main_size
+            roi = (roi[0] / main_w, roi[1] / main_h, roi[2] / main_w, roi[3] / main_h)
+        return roi_to_pixels(roi, width, height)
+
 
 class SemanticSimilarityConfigSchema(BaseModel):
     semantic_regions: List[SemanticRegion]
+    # Largest per-cell difference (gray levels) of a region's tiny crop up to
+    # which its last embedding is reused, 0 = always re-embed (default)
+    change_tolerance: float = 0.0
@@ -9,15 +9,20 @@ from typing import List
 
 from torch import embedding
 from .action import Action
+from core.camera_manager.constants import DEFAULT_CAMERA
 from .schemas import SeeDoSchema, BrightnessConfigSchema, ActionSchema, SemanticSimilarityConfigSchema, SemanticRegion
+from .roi_change_gate import RoiChangeGate
+from .evaluation_plan import SemanticPlan
 
 EMBEDDING_SAVE_FOLDER_BASE = 'data/seedo_config'
 IMAGE_SAVE_FOLDER_BASE = 'data/seedo_config'
 
 class SeeDo:
-    def __init__(self, type, name, interval_sec, min_retrigger_interval_sec, action: Action, enabled=True):
+    def __init__(self, type, name, interval_sec, min_retrigger_interval_sec, action: Action, enabled=True,
+                 camera=DEFAULT_CAMERA):
         self.type = type
         self.name = name
+        self.camera = camera
         self.interval_sec = interval_sec
         self.min_retrigger_interval_sec = min_retrigger_interval_sec
         #TODO maybe support multiple actions
@@ -70,38 +75,47 @@ class SeeDo:
     
 class SemanticSimilaritySeeDo(SeeDo):
     """A seedo that compares semantic similarity of regions in the frame to reference embeddings."""
-    def __init__(self, type, name, interval_sec, min_retrigger_interval_sec, semantic_regions: List[SemanticSimilarityConfigSchema], action, enabled=True):
-        super().__init__(type, name, interval_sec, min_retrigger_interval_sec, action, enabled)
+    def __init__(self, type, name, interval_sec, min_retrigger_interval_sec, semantic_regions: List[SemanticSimilarityConfigSchema], action, enabled=True, camera=DEFAULT_CAMERA,
+                 change_tolerance=0.0):
+        super().__init__(type, name, interval_sec, min_retrigger_interval_sec, action, enabled, camera)
         self.semantic_regions = semantic_regions  # List of dicts with roi and embedding
+        # Regions whose crop hasn't changed reuse their last similarity
+        self.change_gate = RoiChangeGate(change_tolerance)
+        # Regions compiled to arrays once, SeeDoManager evaluates all SeeDos
+        # of a camera through a combined plan instead
+        self.plan = SemanticPlan([self])
         
 
     def evaluate(self, frame, timestamp, ml_manager) -> bool:
         if frame is None:
             return False
 
-        images = []
-        for region in self.semantic_regions:
-            x1, y1, x2, y2 = region.roi
-            pil = Image.fromarray(frame)
-            cropped = pil.crop((x1, y1, x2, y2))
-            images.append(cropped)
+        return self.plan.evaluate(frame, timestamp, ml_manager)[self]
 
-        # Compute embeddings batch
-        new_embeddings = ml_manager.mobile_net_v3.get_embedding_batch(images)
-
-        # check thresholds individually
-        triggered = False
-        for region, current_emb in zip(self.semantic_regions, new_embeddings):
-            sim = ml_manager.mobile_net_v3.cosine_similarity_matrix(
-                np.vstack([region.embedding.squeeze(), current_emb.squeeze()])
-            )[0,1]
-
-            if region.greater_than and sim > region.similarity_threshold:
-                triggered = True
-            elif not region.greater_than and sim < region.similarity_threshold:
-                triggered = True
-
-        return triggered
+    def rebase_references(self, frame, ml_manager) -> bool:
+        """Re-embed references taken from full-resolution crops as the lores
+        stream would see them: the saved crop is scaled by the lores/main
+        ratio of frame first. Returns True if any region changed."""
+        legacy = [(i, r) for i, r in enumerate(self.semantic_regions)
+                  if not r.lores_reference and r.image is not None]
+        if not legacy or frame.lores_size is None:
+            return False
+        scale_x = frame.lores_size[0] / frame.width
+        scale_y = frame.lores_size[1] / frame.height
+        images = [
+            r.image.convert("RGB").resize((max(1, round(r.image.width * scale_x)),
+                                           max(1, round(r.image.height * scale_y))), Image.BILINEAR)
+            for _, r in legacy
+        ]
+        embeddings = ml_manager.mobile_net_v3.get_embedding_batch(images)
+        for (i, region), embedding in zip(legacy, embeddings):
+            region.embedding = embedding
+            region.embedding_path = self.save_roi_embedding_to_file(self.name, i, embedding)
+            region.lores_reference = True
+        self.plan = SemanticPlan([self])
+        self.change_gate.reset()
+        print(f"[{self.name}] re-embedded {len(legacy)} reference(s) for the lores stream")
+        return True
 
 
     
@@ -142,6 +156,7 @@ class SemanticSimilaritySeeDo(SeeDo):
         for idx, region in enumerate(self.semantic_regions):
             regions.append({
                 "roi": region.roi,
+                "normalized": region.normalized,
                 "image_path": self.build_roi_image_save_path(self.name, idx),
                 "embedding_path": self.build_embedding_save_path(self.name, idx),
                 "similarity_threshold": region.similarity_threshold,
@@ -154,8 +169,10 @@ class SemanticSimilaritySeeDo(SeeDo):
             "interval_sec": self.interval_sec,
             "min_retrigger_interval_sec": self.min_retrigger_interval_sec,
             "enabled": self.enabled,
+            "camera": self.camera,
             "config": {
-                "semantic_regions": [r.model_dump(exclude={"image", "embedding"}) for r in self.semantic_regions]
+                "semantic_regions": [r.model_dump(exclude={"image", "embedding"}) for r in self.semantic_regions],
+                "change_tolerance": self.change_gate.tolerance
             },
             "action": self.action.to_dict()
         }
@@ -185,14 +202,16 @@ class SemanticSimilaritySeeDo(SeeDo):
             min_retrigger_interval_sec=schema.min_retrigger_interval_sec,
             semantic_regions=semantic_regions,
             action=action,
-            enabled=schema.enabled
+            enabled=schema.enabled,
+            camera=schema.camera,
+            change_tolerance=config.change_tolerance
         )
     
 
 
 class BrightnessSeeDo(SeeDo):
-    def __init__(self, type, name, interval_sec, min_retrigger_interval_sec, threshold, action, enabled=True):
-        super().__init__(type, name, interval_sec, min_retrigger_interval_sec, action, enabled)
+    def __init__(self, type, name, interval_sec, min_retrigger_interval_sec, threshold, action, enabled=True, camera=DEFAULT_CAMERA):
+        super().__init__(type, name, interval_sec, min_retrigger_interval_sec, action, enabled, camera)
         self.threshold = threshold
 
     @classmethod
@@ -202,7 +221,10 @@ class BrightnessSeeDo(SeeDo):
     def evaluate(self, frame, timestamp, ml_manager):
         if frame is None:
             return False
-        brightness = frame.mean()
+        # Mean over all channels doesn't depend on channel order, so the
+        # native BGR buffer gives the same value without a conversion. A
+        # reduced-size decode is plenty for a mean.
+        brightness = frame.native_at_least(160).mean()
         print(f"[{self.name}] brightness={brightness}")
         if self.threshold < 0:
             return brightness < -self.threshold
@@ -217,7 +239,8 @@ class BrightnessSeeDo(SeeDo):
             min_retrigger_interval_sec=schema.min_retrigger_interval_sec,
             threshold=config.threshold,
             action=action,
-            enabled=schema.enabled
+            enabled=schema.enabled,
+            camera=schema.camera
         )
     
     def to_dict(self):
@@ -227,6 +250,7 @@ class BrightnessSeeDo(SeeDo):
         interval_sec=self.interval_sec,
         min_retrigger_interval_sec=self.min_retrigger_interval_sec,
         enabled=self.enabled,
+        camera=self.camera,
         config=BrightnessConfigSchema(threshold=self.threshold).model_dump(),
         action=self.action.to_dict()
         )
@@ -1,15 +1,25 @@
-import time
 import threading
 from helpers.config_loading import load_all_seedos, save_seedo
+from core.camera_manager.camera_manager import RECORDING_MODE_EVENT
+from core.seedo.seedo import SemanticSimilaritySeeDo
+from core.seedo.evaluation_plan import SemanticPlan
 
 class SeeDoManager:
-    def __init__(self, ml_manager, camera_manger):
+    """Schedules SeeDo evaluations. Each camera's frames only go to the
+    SeeDos bound to that camera (SeeDo.camera)."""
+    def __init__(self, ml_manager, cameras):
         self.ml_manager = ml_manager
-        self.camera_manager = camera_manger
+        self.cameras = cameras
         self.seedos = load_all_seedos()
-        self.last_frame_considered = None
+        # Last frame handed out per camera
+        self._last_frame_considered = {}
+        # Semantic SeeDos of each camera compiled into one plan, rebuilt
+        # when SeeDos are added
+        self._plans = {}
 
         print(f"SeeDoManager initialized with {len(self.seedos)} SeeDos.")
+        for seedo in self.seedos:
+            self._check_camera(seedo)
         # I am not sure this should be initialized to zero. What if a SeeDo have past history?
         self._last_run = {seedo: 0.0 for seedo in self.seedos}
 
@@ -28,9 +38,15 @@ class SeeDoManager:
         print(f"{seedo.name} saved")
 
 
+    def _check_camera(self, seedo):
+        if seedo.camera not in self.cameras:
+            print(f"[{seedo.name}] camera '{seedo.camera}' is not configured, SeeDo will not run")
+
     def add(self, seedo):
+        self._check_camera(seedo)
         self.seedos.append(seedo)
         self._last_run[seedo] = 0.0
+        self._plans.pop(seedo.camera, None)
         print('the list of seedos is now')
         for seedo in self.seedos:
             print(seedo.name)
@@ -38,20 +54,51 @@ class SeeDoManager:
     def should_be_run(self, seedo, now):
         return (now - self._last_run[seedo]) >= seedo.interval_sec
 
-    def run(self, frame, now):
-        """Called from AppController.tick()"""
+    def run(self, camera_name, frame, now):
+        """Called from AppController.tick() with each camera's newest frame"""
         if frame is None:
             return
 
-        if frame is self.last_frame_considered:
+        # Same Frame as last tick (capture hasn't published a new one)
+        if frame is self._last_frame_considered.get(camera_name):
             return
                 
-        self.last_frame_considered = frame
+        self._last_frame_considered[camera_name] = frame
 
+        semantic = []
         for seedo in self.seedos:
+            if seedo.camera != camera_name:
+                continue
             if seedo.enabled and self.should_be_run(seedo, now):
                 self._last_run[seedo] = now
-                self._launch_eval_thread(seedo, frame, now)
+                if isinstance(seedo, SemanticSimilaritySeeDo):
+                    semantic.append(seedo)
+                else:
+                    self._launch_eval_thread(seedo, frame, now)
+
+        if semantic:
+            # All due semantic SeeDos share one evaluation of the plan
+            threading.Thread(
+                target=self._process_semantic_seedos,
+                args=(camera_name, semantic, frame, now),
+                daemon=True
+            ).start()
+
+    def _plan_for(self, camera_name, frame) -> SemanticPlan:
+        plan = self._plans.get(camera_name)
+        if plan is None:
+            seedos = [
+                s for s in self.seedos
+                if s.camera == camera_name and isinstance(s, SemanticSimilaritySeeDo)
+            ]
+            # References from older configs were embedded from full-resolution
+            # crops, regions are now cropped from the lores stream
+            for seedo in seedos:
+                if seedo.rebase_references(frame, self.ml_manager):
+                    save_seedo(seedo)
+            plan = SemanticPlan(seedos)
+            self._plans[camera_name] = plan
+        return plan
 
     def _launch_eval_thread(self, seedo, frame, now):
         threading.Thread(
@@ -60,15 +107,43 @@ class SeeDoManager:
             daemon=True
         ).start()
 
+    def _process_semantic_seedos(self, camera_name, seedos, frame, now):
+        results = self._plan_for(camera_name, frame).evaluate(frame, now, self.ml_manager, seedos)
+        for seedo, result in results.items():
+            if result:
+                # Actions can block for the clip post-roll, don't hold up the others
+                threading.Thread(
+                    target=self._handle_result,
+                    args=(seedo, result, frame.rgb, now),
+                    daemon=True
+                ).start()
+
     def _process_seedo(self, seedo, frame, now):
         result = seedo.evaluate(frame, now, self.ml_manager)
+        if result:
+            # Hand on only the RGB image: the Frame pins a capture ring slot
+            # and the action waits for the clip post-roll
+            threading.Thread(
+                target=self._handle_result,
+                args=(seedo, result, frame.rgb, now),
+                daemon=True
+            ).start()
+
+    def _handle_result(self, seedo, result, image, now):
+        camera_manager = self.cameras.get(seedo.camera)
+        if camera_manager is None:
+            print(f"[{seedo.name}] camera '{seedo.camera}' is not configured, action skipped")
+            return
         if result:
             with seedo._action_lock:
                 if (now - seedo._last_action_time) >= seedo.min_retrigger_interval_sec:
                     seedo._last_action_time = now
                     print(f"[{seedo.name}] Triggered!")
-                    time.sleep(7)
-                    saved_file_path = self.camera_manager.get_and_combine_past_video(15, now+5)
-                    seedo.action.execute({"timestamp": now, "frame": frame, "saved_file_path": saved_file_path})
+                    if camera_manager.recording_mode == RECORDING_MODE_EVENT:
+                        saved_file_path = camera_manager.record_event_clip(now, 10, 5)
+                    else:
+                        # Waits for the post-roll, then includes frames up to now
+                        saved_file_path = camera_manager.get_and_combine_past_video(15, now+5)
+                    seedo.action.execute({"timestamp": now, "frame": image, "saved_file_path": saved_file_path})
                 else:
                     print(f"[{seedo.name}] Retrigger interval not elapsed.")
\ No newline at end of file
@@ -1,15 +1,27 @@
-from ui.app import SeeDoApp
-from ui.styles.button_styles import setup_button_styles
-from ui.styles.combo_box_styles import setup_combo_box_styles
-from controller.controller import AppController
 from core.secrets import load_secrets
+import sys
 
 
 if __name__ == "__main__":
     load_secrets()
+    if "--benchmark" in sys.argv:
+        from core.camera_manager.benchmark import main as run_benchmark
+        sys.exit(run_benchmark(sys.argv[sys.argv.index("--benchmark") + 1:]))
+
+    from controller.controller import AppController
     controller = AppController()
+    if "--headless" in sys.argv:
+        # No Tk here, headless hosts may not have a display or tkinter.
+        # Recording stays off unless asked for, as in the UI.
+        if "--record" in sys.argv:
+            controller.start_recording()
+        controller.run_headless()
+        sys.exit(0)
+
+    from ui.app import SeeDoApp
+    from ui.styles.button_styles import setup_button_styles
+    from ui.styles.combo_box_styles import setup_combo_box_styles
     app = SeeDoApp(controller)
     setup_button_styles()
     setup_combo_box_styles()
     app.mainloop()
-
@@ -1,10 +1,11 @@
 import tkinter as tk
 from tkinter import ttk
-from PIL import Image, ImageTk, ImageOps
+from PIL import Image, ImageTk
 import numpy as np
 import timeit
 import time
 import threading
+from core.seedo.schemas import roi_to_pixels
 
 class CameraFeedViewer(tk.Frame):
     def __init__(self, parent, controller, width, height):
@@ -98,10 +99,9 @@ class CameraFeedViewer(tk.Frame):
                     tags='camera_off'
                 )
             else:
-                frame = self.controller.get_latest_frame()
+                frame = self.controller.get_latest()
                 if frame is not None:
-                    img = Image.fromarray(frame)
-                    img = ImageOps.pad(img, (self.width, self.height), color="black")
+                    img = Image.fromarray(frame.thumbnail(self.width, self.height))
                     self.imgtk = ImageTk.PhotoImage(image=img)
                     self.camera_viewer.delete("all")
                     self.camera_viewer.create_image(0,0,anchor=tk.NW,image = self.imgtk, tags='frame')
@@ -170,18 +170,19 @@ class CameraFeedViewer(tk.Frame):
     def start_similarity_thread(self):
         def worker():
             while self.show_similarities and not self.stop_similarity_thread:
-                frame = self.controller.camera_manager.latest_frame
+                frame = self.controller.get_latest()
                 if frame is None:
                     continue
 
-                img = Image.fromarray(frame)
+                h, w = frame.lores_rgb.shape[:2]
+                regions = self.parent.semantic_regions
                 results = {}
                 print('Computing similarities...')
-                for i, region in enumerate(self.parent.semantic_regions):
-                    x1, y1, x2, y2 = region['roi']
-                    cropped = img.crop((x1, y1, x2, y2))
-                    cropped.save("worker_debug_current_roi.png")
-                    current_embedding = self.controller.ml_manager.mobile_net_v3.get_image_embedding(cropped)
+                # One request for all regions, batched with the running SeeDos
+                embeddings = self.controller.ml_manager.embedding_service.embed(
+                    frame, [roi_to_pixels(region['roi'], w, h) for region in regions]
+                )
+                for i, (region, current_embedding) in enumerate(zip(regions, embeddings)):
                     sim = self.controller.ml_manager.mobile_net_v3.cosine_similarity_matrix(
                         np.vstack([region['embedding'].squeeze(), current_embedding.squeeze()])
                     )
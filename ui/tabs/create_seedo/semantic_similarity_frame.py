@@ -3,6 +3,7 @@ from tkinter import ttk
 from PIL import Image, ImageTk, ImageOps
 import numpy as np  
 from .camera_feed_viewer import CameraFeedViewer
+from core.seedo.schemas import roi_to_pixels
 from .semantic_similarity_options import SemanticSimilarityOptions
 
 class CreateSeeDo_Semantic_Similarity_Frame(tk.Frame):
@@ -23,7 +24,7 @@ class CreateSeeDo_Semantic_Similarity_Frame(tk.Frame):
         self.semantic_regions = []
         # Each item will have the format
         #  {
-        #   roi: list (tuple (x1, y1, x2, y2)) in captured image coords
+        #   roi: tuple (x1, y1, x2, y2) normalized to [0, 1] of the image
         #   embedding: np.ndarray | None = None,
         #   image: Image.Image | None = None
         #   label: str | None = None
@@ -155,15 +156,10 @@ class CreateSeeDo_Semantic_Similarity_Frame(tk.Frame):
             return pad_x, pad_y
     
     def calculate_roi_scaling_factor(self):
-        """Calculate scaling factor for ROI selection based on camera viewer size and
-        actual image size."""
-        camera = self.controller.camera_manager
-        # Get actual camera resolution
-        actual_width = camera.target_width
-        actual_height = camera.target_height
-
-        scale_x = actual_width / (self.camera_viewer_width - 2 * self.roi_padding_offset[0])
-        scale_y = actual_height / (self.camera_viewer_height - 2 * self.roi_padding_offset[1])
+        """Calculate scaling factor from canvas pixels to normalized image
+        coords, so ROIs map onto any stream resolution."""
+        scale_x = 1 / (self.camera_viewer_width - 2 * self.roi_padding_offset[0])
+        scale_y = 1 / (self.camera_viewer_height - 2 * self.roi_padding_offset[1])
 
         return scale_x, scale_y
 
@@ -175,15 +171,16 @@ class CreateSeeDo_Semantic_Similarity_Frame(tk.Frame):
         if not camera.active:
             print("Camera not active, cannot capture embeddings.")
             return
-        latest_frame = camera.latest_frame
-        if latest_frame is None:
+        latest = camera.latest
+        if latest is None:
             print("No frame available from camera.")
             return
+        # Same stream the SeeDo evaluates on
+        frame_img = latest.lores_pil()
         images = []
         for region in self.semantic_regions:
             roi = region['roi']
-            img = Image.fromarray(latest_frame)
-            img = self.get_image_from_frame(img, roi)
+            img = self.get_image_from_frame(frame_img, roi)
             region['image'] = img
             images.append(img)
             #TODO need to remove direct call to ml_manager from here
@@ -192,20 +189,19 @@ class CreateSeeDo_Semantic_Similarity_Frame(tk.Frame):
             region['embedding'] = embedding
             
     def get_image_from_frame(self, frame, roi):
-        x1, y1, x2, y2 = roi
-        return frame.crop((x1, y1, x2, y2))
+        return frame.crop(roi_to_pixels(roi, frame.width, frame.height))
     
     def apply_roi_offset_and_scale(self, x1, y1, x2, y2):
-        """go from canvas coords to actual image coords"""
+        """go from canvas coords to normalized image coords"""
         pad_x, pad_y = self.roi_padding_offset
         scale_x, scale_y = self.roi_scaling_factor
-        return (round((x1 - pad_x) * scale_x), 
-                round((y1 - pad_y) * scale_y), 
-                round((x2 - pad_x) * scale_x), 
-                round((y2 - pad_y) * scale_y))
+        return (min(max((x1 - pad_x) * scale_x, 0.0), 1.0),
+                min(max((y1 - pad_y) * scale_y, 0.0), 1.0),
+                min(max((x2 - pad_x) * scale_x, 0.0), 1.0),
+                min(max((y2 - pad_y) * scale_y, 0.0), 1.0))
     
     def remove_roi_offset_and_scale(self, x1, y1, x2, y2):
-        """go from actual image coords to canvas coords"""
+        """go from normalized image coords to canvas coords"""
         pad_x, pad_y = self.roi_padding_offset
         scale_x, scale_y = self.roi_scaling_factor
         return (round(x1 / scale_x + pad_x), 
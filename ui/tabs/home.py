@@ -135,11 +135,12 @@ class CameraViewerView(tk.Frame):
             self.video_label.config(image='', text="Camera not running...")
             return
 
-        frame = camera.latest_frame
+        frame = camera.latest
         if frame is None:
             return
 
-        img = Image.fromarray(frame)
+        # Preview from the lores stream, stills from the full-resolution one
+        img = frame.lores_pil()
         imgtk = ImageTk.PhotoImage(image=img)
         self.video_label.imgtk = imgtk
         self.video_label.configure(image=imgtk)
@@ -147,9 +148,9 @@ class CameraViewerView(tk.Frame):
         if (self.capture_still):
             h = os.getenv('HEIGHT')
             w = os.getenv('WIDTH')
-            img_full = img
+            img_full = frame.pil()
             if h and w:
-                img_full = img.resize((int(w),int(h)))
+                img_full = img_full.resize((int(w),int(h)))
             img_full.save('core/data/stills/most_recent_preview.png')
             self.capture_still = False
 